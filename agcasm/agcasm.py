@@ -27,6 +27,10 @@ from architecture import Architecture
 from assembler import Assembler
 from context import Context
 from binary import ObjectCode
+from cache import ModuleCache
+from objfile import ObjectFileCache
+from number import Number
+from listing import ListingWriter
 
 def main():
     totalTime = 0.0
@@ -38,12 +42,22 @@ def main():
     parser.add_option("-t", "--test", action="store_true", dest="test", default=False, help="Run assembler test code.")
     parser.add_option("-d", "--debug", action="store_true", dest="debug", default=False, help="Turn on assembler debugging code.")
     parser.add_option("-s", "--syntax-only", action="store_true", dest="syntaxOnly", default=False, help="Exit after checking syntax.")
+    parser.add_option("-r", "--relocatable", action="store_true", dest="relocatable", default=False, help="Write an object file for each module, and exit after pass 1.")
+    parser.add_option("--link", action="store_true", dest="link", default=False, help="Link the object files of each module, rather than assembling them.")
+    parser.add_option("-c", "--cache", action="store_true", dest="cache", default=False, help="Cache the pass 1 output of each module, and reuse it for unchanged modules.")
     (options, args) = parser.parse_args()
 
     if len(args) < 1:
         parser.error("At least one source file must be supplied!")
         sys.exit(1)
 
+    if (options.relocatable and options.link) or (options.cache and (options.relocatable or options.link)):
+        parser.error("Only one of --relocatable, --link and --cache may be used!")
+        sys.exit(1)
+    if options.relocatable:
+        # Object files hold the pass 1 output, symbol resolution and code generation are done at link time.
+        options.syntaxOnly = True
+
     sources = []
     for arg in args:
         sources.append(arg)
@@ -57,15 +71,21 @@ def main():
     firstfilename = args[0].split('.')[0]
     
     listfile = open(firstfile + ".lst", 'w')
-    symtabfile = open(firstfile + ".symtab", 'w')
+    symtabfile = open(firstfile + ".symtab", 'wb')
     binfile = open(firstfile + ".bin", 'wb')
     logfile = None
     if options.logLevel > 0:
         logfile = open(firstfilename + ".log", 'w')
 
     context = Context(Architecture.AGC4_B2, listfile, binfile, options, int(options.logLevel), logfile)
+    listfile = ListingWriter(context, listfile)
+    context.listfile = listfile
     assembler = Assembler(context)
     context.assembler = assembler
+    if options.cache:
+        context.cache = ModuleCache(context, firstfilename + ".cache")
+    elif options.relocatable or options.link:
+        context.cache = ObjectFileCache(context, required=options.link)
 
     if options.debug:
         print "Build:", buildname 
@@ -81,6 +101,8 @@ def main():
     for arg in args:
         try:
             assembler.assemble(arg)
+        except SystemExit:
+            raise
         except:
             print >>sys.stderr
             print >>sys.stderr, "EXCEPTION:"
@@ -94,6 +116,11 @@ def main():
         totalTime += delta
         print "Pass 1: %3.2f seconds" % delta
 
+    if context.cache != None:
+        context.cache.save()
+        if options.debug:
+            print "Module cache: %d hits, %d misses" % (context.cache.hits, context.cache.misses)
+
     context.saveCurrentBank()
 
     if options.syntaxOnly == False and context.errors == 0:
@@ -102,7 +129,7 @@ def main():
         try:
             assembler.resolve()
         except:
-            assembler.log(1, "EXCEPTION:\n%s" % context)
+            assembler.log(1, "EXCEPTION:\n%s", context)
             raise
         if options.debug:
             endTime = time.time()
@@ -117,8 +144,7 @@ def main():
     print >>listfile
     print >>listfile, "Listing"
     print >>listfile, "-------"
-    for record in assembler.context.records:
-        print >>listfile, record
+    listfile.writeRecords(assembler.context.records)
     if options.debug:
         endTime = time.time()
         delta = endTime - startTime
@@ -179,14 +205,14 @@ def main():
             common_syms = []
 
             for sym in assembler.context.symtab.keys():
-                if sym in ARTEMIS_SYMBOLS.keys():
+                if sym in ARTEMIS_SYMBOLS:
                     common_syms.append(sym)
                 else:
                     if sym != "FIXED":
                         my_syms.append(sym)
 
             for sym in ARTEMIS_SYMBOLS.keys():
-                if sym not in assembler.context.symtab.keys():
+                if sym not in assembler.context.symtab:
                     if not sym.startswith('$') and sym != "'":
                         other_syms.append(sym)
 
@@ -286,8 +312,12 @@ def main():
     binfile.close()
     if logfile:
         logfile.close()
+        if options.debug:
+            print "Logging: %3.2f seconds" % context.logTime
 
     if options.debug:
+        (hits, misses, size) = Number.getCacheStats()
+        print "Number cache: %d hits, %d misses, %d entries" % (hits, misses, size)
         print "Total time: %3.2f seconds" % totalTime
 
     print "Done."
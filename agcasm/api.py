@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+# Copyright 2010 Jim Lawton <jim dot lawton at gmail dot com>
+#
+# This file is part of pyagc.
+#
+# This is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+from optparse import Values
+from StringIO import StringIO
+from architecture import Architecture
+from assembler import Assembler
+from context import Context
+from binary import ObjectCode
+from listing import ListingWriter
+
+class AssemblyResult:
+    """Class storing the output of an in-memory assembly."""
+
+    def __init__(self, context, rope):
+        self.context = context              # Assembler context.
+        self.records = context.records      # Parser records, one per source line.
+        self.symtab = context.symtab        # Symbol table.
+        self.rope = rope                    # Object code, or None if there were errors.
+        self.errors = context.errors
+        self.warnings = context.warnings
+
+    def getBinary(self):
+        "Return the rope image in .bin format, or None if there were errors."
+        if self.rope == None:
+            return None
+        return self.rope.getBytes()
+
+    def getListing(self):
+        "Return the source listing."
+        out = StringIO()
+        writer = ListingWriter(self.context, out)
+        writer.writeRecords(self.records)
+        writer.flush()
+        return out.getvalue()[:-1]
+
+def assemble(sources, main="MAIN.agc", arch=Architecture.AGC4_B2, debug=False):
+    """Assemble a program without any file I/O, and return an AssemblyResult.
+
+    sources is either a dictionary mapping module names to source text, or a function which is called with a
+    module name and returns its source text, or None if there is no such module. main is the name of the
+    top-level module."""
+    if isinstance(sources, dict):
+        loader = lambda modname: _split(sources.get(modname))
+    else:
+        loader = lambda modname: _split(sources(modname))
+
+    options = Values({ "verbose": False, "debug": debug })
+    context = Context(arch, None, None, options)
+    assembler = Assembler(context, loader)
+    context.assembler = assembler
+
+    rope = None
+    try:
+        assembler.assemble(main)
+        context.saveCurrentBank()
+        if context.errors == 0:
+            assembler.resolve()
+        if context.errors == 0:
+            rope = ObjectCode(context)
+            rope.generateBuggers()
+    except SystemExit:
+        # Fatal error, already counted.
+        rope = None
+    return AssemblyResult(context, rope)
+
+def _split(text):
+    "Split source text into lines, as file.readlines() would."
+    if text == None:
+        return None
+    return StringIO(text).readlines()
@@ -25,19 +25,28 @@ from opcode import OpcodeType
 from parser_record import ParserRecord
 from record_type import RecordType
 from interpretive import Interpretive
-from number import Number
+from lexer import Lexer
 
 class Assembler:
     """Class defining an AGC assembler."""
 
-    def __init__(self, context):
+    def __init__(self, context, loader=None):
         self.context = context
+        # Source loader, called with a module name and returning its lines, or None if it does not exist.
+        if loader == None:
+            loader = self._readFile
+        self.loader = loader
         self.context.fatal = self.fatal
         self.context.error = self.error
         self.context.syntax = self.syntax
         self.context.warn = self.warn
         self.context.info = self.info
-        self.context.log = self.log
+        self.lexer = Lexer()
+        if self.context.logLevel > 0:
+            self.context.log = self.log
+        else:
+            # Logging disabled, skip even the level check.
+            self.context.log = self._nolog
 
     def _makeNewRecord(self, line, rectype, label, pseudolabel, opcode, operands, comment):
         srcfile = self.context.srcfile
@@ -53,129 +62,95 @@ class Assembler:
             tmpType = RecordType.NONE
         return ParserRecord(self.context, srcfile, linenum, srcline, tmpType, label, pseudolabel, opcode, operands, comment, address, code)
 
-    def assemble(self, srcfile):
-        self.info("Assembling %s" % srcfile, source=False)
-        self.context.srcfile = srcfile
-        self.context.linenum = 0
+    def _readFile(self, srcfile):
+        "Return the lines of a source file, or None if it does not exist."
+        if not os.path.isfile(srcfile):
+            return None
         sfile = open(srcfile)
         lines = sfile.readlines()
-        self.context.log(7, "assemble: file %s, lines %d" % (srcfile, len(lines)))
         sfile.close()
-        
+        return lines
+
+    def assemble(self, srcfile, lines=None):
+        if lines == None:
+            lines = self.loader(srcfile)
+            if lines == None:
+                self.fatal("File \"%s\" does not exist" % srcfile, source=False)
+        self.info("Assembling %s" % srcfile, source=False)
+        self.context.srcfile = srcfile
+        self.context.linenum = 0
+        self.context.log(7, "assemble: file %s, lines %d", srcfile, len(lines))
+
+        cache = None
+        if self.context.cache != None:
+            cache = self.context.cache
+            for line in lines:
+                if line.startswith('$'):
+                    # Only modules which do not include others are cached.
+                    cache = None
+                    break
+        if cache != None:
+            digest = cache.getDigest(lines)
+            entryState = cache.getEntryState()
+            entry = cache.lookup(srcfile, digest, entryState)
+            if entry != None:
+                cache.restore(srcfile, entry)
+                return
+            if cache.required:
+                self.fatal("cannot link %s, %s, reassemble with --relocatable" % (srcfile, cache.reason), source=False)
+            cache.begin(digest, entryState)
+
         for line in lines:
             indentError = False
             if line.endswith('\n'):
                 line = line[:-1]
-            srcline = line.expandtabs(8)
+            (rectype, srcline, label, pseudolabel, opcode, operands, comment, opindex) = self.lexer.lex(line)
             self.context.srcline = srcline
             self.context.linenum += 1
             self.context.global_linenum += 1
             self.context.code = None
             self.context.addSymbol = True
             self.context.messages = []
-            label = None
-            pseudolabel = None
-            opcode = None
-            operands = None
-            comment = None
 
-            self.context.log(7, "assemble: %s %d/%d (%d) \"%s\"" % (srcfile, self.context.linenum, len(lines), self.context.global_linenum, self.context.srcline))
+            self.context.log(7, "assemble: %s %d/%d (%d) \"%s\"", srcfile, self.context.linenum, len(lines), self.context.global_linenum, self.context.srcline)
 
-            if line.startswith('$'):
-                modname = line[1:].split()[0]
-                if not os.path.isfile(modname):
+            if rectype == RecordType.INCLUDE:
+                modname = operands[0]
+                modlines = self.loader(modname)
+                if modlines == None:
                     self.fatal("File \"%s\" does not exist" % modname, source=False)
-                record = self._makeNewRecord(srcline, RecordType.INCLUDE, None, None, None, None, comment)
-                record.complete = True
-                self.context.records.append(record)
-                self.context.log(7, "assemble: added record %d" % (len(self.context.records) - 1))
-                self.assemble(modname)
-                continue
-
-            if len(line.strip()) == 0:
-                record = self._makeNewRecord(srcline, RecordType.BLANK, None, None, None, None, None)
+                record = self._makeNewRecord(srcline, RecordType.INCLUDE, None, None, None, None, None)
                 record.complete = True
                 self.context.records.append(record)
-                self.context.log(7, "assemble: added record %d" % (len(self.context.records) - 1))
+                self.context.log(7, "assemble: added record %d", len(self.context.records) - 1)
+                self.assemble(modname, modlines)
                 continue
 
-            if line.strip().startswith('#'):
-                comment = line
-                record = self._makeNewRecord(srcline, RecordType.COMMENT, None, None, None, None, comment)
+            if rectype != RecordType.NONE:
+                # Blank, comment-only or label-only line.
+                if rectype == RecordType.LABEL:
+                    self.context.symtab.add(label, None, self.context.loc, 0, RecordType.LABEL)
+                record = self._makeNewRecord(srcline, rectype, label, None, None, None, comment)
                 record.complete = True
                 self.context.records.append(record)
-                self.context.log(7, "assemble: added record %d" % (len(self.context.records) - 1))
+                self.context.log(7, "assemble: added record %d", len(self.context.records) - 1)
                 continue
 
-            # Real parsing starts here.
-            if '#' in line:
-                comment = line[line.index('#'):]
-                line = line[:line.index('#')]
-            fields = line.split()
-            if not line.startswith(' ') and not line.startswith('\t'):
-                if line.startswith('+') or line.startswith('-'):
-                    # Check if label is [+-]number, which is a pseudo-label.
-                    checknum = fields[0][1:]
-                    checkval = Number(checknum)
-                    if checkval.isValid():
-                        # It's a pseudo-label.
-                        pseudolabel = fields[0]
-                if pseudolabel == None:
-                    label = fields[0]
-                    if len(fields) == 1:
-                        # Label only.
-                        self.context.symtab.add(label, None, self.context.loc, 0, RecordType.LABEL)
-                        record = self._makeNewRecord(srcline, RecordType.LABEL, label, None, None, None, comment)
-                        record.complete = True
-                        self.context.records.append(record)
-                        self.context.log(7, "assemble: added record %d" % (len(self.context.records) - 1))
-                        continue
-                fields = fields[1:]
-            else:
-                if line.strip(' ').startswith('+') or line.strip(' ').startswith('-'):
-                    # It's a pseudo-label.
-                    pseudolabel = fields[0]
-                    fields = fields[1:]
-            try:
-                opcode = fields[0]
-            except:
-                print self.context.srcfile, self.context.linenum
-                print line
-                print fields
-                raise
-            operands = " " .join(fields[1:])
-            if operands == "":
-                operands = None
-            else:
-                operands = operands.strip().split()
-
-            label_len = 0
-            if label != None:
-                label_len = len(label)
-
-            if opcode != None:
-                opindex = self.context.srcline.find(opcode, label_len)
-            elif operands != None:
-                opindex = self.context.srcline.find(operands[0], label_len)
-            else:
-                opindex = -1
+            if opindex == 24:
+                newoperands = [ opcode ]
+                if operands != None:
+                    newoperands.extend(operands)
+                if opcode not in self.context.opcodes[OpcodeType.DIRECTIVE] and \
+                   (opcode not in self.context.opcodes[self.context.mode] or \
+                   (opcode in self.context.opcodes[self.context.mode] and opcode != self.context.opcodes[self.context.mode][opcode].mnemonic)) or \
+                   ((opcode == "TC" or opcode == "VN" or opcode == "MM") and operands == None):
+                    # Handle stand-alone interpretive operands.
+                    operands = newoperands
+                    opcode = None
+                else:
+                    indentError = True
 
-            if opindex != -1:
-                if opindex == 24:
-                    newoperands = [ opcode ]
-                    if operands != None:
-                        newoperands.extend(operands)
-                    if opcode not in self.context.opcodes[OpcodeType.DIRECTIVE] and \
-                       (opcode not in self.context.opcodes[self.context.mode] or \
-                       (opcode in self.context.opcodes[self.context.mode] and opcode != self.context.opcodes[self.context.mode][opcode].mnemonic)) or \
-                       ((opcode == "TC" or opcode == "VN" or opcode == "MM") and operands == None):
-                        # Handle stand-alone interpretive operands.
-                        operands = newoperands
-                        opcode = None
-                    else:
-                        indentError = True
-
-            self.context.log(7, "assemble: label='%s' opcode='%s' operands=%s [%d]" % (label, opcode, operands, opindex))
+            self.context.log(7, "assemble: label='%s' opcode='%s' operands=%s [%d]", label, opcode, operands, opindex)
 
             self.context.previousRecord = self.context.currentRecord
             self.context.currentRecord = self._makeNewRecord(srcline, RecordType.NONE, label, pseudolabel, opcode, operands, comment)
@@ -183,6 +158,10 @@ class Assembler:
                line.startswith('\t-') or line.startswith(' \t-'):
                 # It's a pseudo-label.
                 self.context.warn("bad indentation")
+            if opcode == None and operands == None:
+                self.context.error("missing opcode")
+                self.context.records.append(self.context.currentRecord)
+                continue
             if opindex != -1:
                 if opindex != 16 and opindex != 24:
                     self.context.error("bad indentation")
@@ -190,35 +169,42 @@ class Assembler:
                     # TC is also used as an interpretive label.
                     if opcode != None:
                         self.context.warn("bad indentation")
+            state = self.context.saveState()
             self.parse(label, opcode, operands)
             self.context.currentRecord.update()
+            if not self.context.currentRecord.complete and self.context.currentRecord.isParseable():
+                # Save the entry and exit state, so that pass 2 can re-encode the record in isolation.
+                self.context.currentRecord.state = state
+                self.context.currentRecord.exitState = self.context.saveState()
             self.context.records.append(self.context.currentRecord)
-            self.context.log(7, "assemble: added record %d" % (len(self.context.records) - 1))
+            self.context.log(7, "assemble: added record %d", len(self.context.records) - 1)
+
+        if cache != None:
+            cache.end(srcfile, len(lines))
 
     def parse(self, label, opcode, operands):
         try:
-            self.context.log(7, "parse: label='%s' opcode='%s' operands=%s" % (label, opcode, operands))
+            self.context.log(7, "parse: label='%s' opcode='%s' operands=%s", label, opcode, operands)
 
             preloc = self.context.loc
 
             if opcode == None:
                 Interpretive.parseOperand(self.context, operands)
             else:
-                if opcode in self.context.opcodes[OpcodeType.INTERPRETIVE]:
-                    self.context.opcodes[OpcodeType.INTERPRETIVE][opcode].parse(self.context, operands)
-                elif opcode in self.context.opcodes[OpcodeType.DIRECTIVE]:
-                    self.context.opcodes[OpcodeType.DIRECTIVE][opcode].parse(self.context, operands)
-                elif opcode in self.context.opcodes[self.context.mode]:
-                    if self.context.interpArgs > 0 or self.context.interpArgCount > 0:
-                        self.context.log(5, "parse: resetting interpArgs, %d -> %d" % (self.context.interpArgs, 0))
-                        self.context.interpArgs = 0
-                        self.context.interpArgCount = 0
-                        self.context.interpArgTypes = [ None, None, None, None ]
-                        self.context.interpArgCodes = [ 0, 0, 0, 0 ]
-                        self.context.interpArgIncrement = [ False, False, False, False ]
-                    self.context.opcodes[self.context.mode][opcode].parse(self.context, operands)
-                else:
+                entry = self.context.dispatch.get((self.context.mode, opcode))
+                if entry == None:
                     self.error("invalid opcode")
+                else:
+                    (handler, optype) = entry
+                    if optype == self.context.mode:
+                        if self.context.interpArgs > 0 or self.context.interpArgCount > 0:
+                            self.context.log(5, "parse: resetting interpArgs, %d -> %d", self.context.interpArgs, 0)
+                            self.context.interpArgs = 0
+                            self.context.interpArgCount = 0
+                            self.context.interpArgTypes = [ None, None, None, None ]
+                            self.context.interpArgCodes = [ 0, 0, 0, 0 ]
+                            self.context.interpArgIncrement = [ False, False, False, False ]
+                    handler(self.context, operands)
 
             if label != None and self.context.addSymbol == True and self.context.passnum == 0:
                 if not self.context.reparse:
@@ -240,6 +226,8 @@ class Assembler:
         if recordIndex >= 1:
             self.context.previousRecord = self.context.records[recordIndex - 1]
         self.context.load(record, partial=False)
+        if record.state != None:
+            self.context.loadState(record.state)
         self.context.currentRecord.errorMsg = None
         self.context.currentRecord.warningMsg = None
         self.parse(record.label, record.opcode, record.operands)
@@ -247,19 +235,107 @@ class Assembler:
         self.context.currentRecord = saveRecord
         self.context.previousRecord = savePrevRecord
         self.context.reparse = False
-        self.context.log(6, "updated record %06d: %s" % (recordIndex, self.context.records[recordIndex]))
+        self.context.log(6, "updated record %06d: %s", recordIndex, self.context.records[recordIndex])
 
     def resolve(self, maxPasses=10):
         startTime = time.time()
-        self.context.symtab.resolve(maxPasses)
+        self.context.symtab.resolve()
         if self.context.debug:
             endTime = time.time()
             delta = endTime - startTime
             print "Symbol resolution: %3.2f seconds" % delta
 
         startTime = time.time()
+        self._resolveRecords(maxPasses)
+        if self.context.debug:
+            endTime = time.time()
+            delta = endTime - startTime
+            print "Pass 2: %3.2f seconds" % delta
+
+    def _resolveRecords(self, maxPasses):
+        """Re-encode the parser records left incomplete by pass 1. Each record is re-encoded from the assembler state
+        saved when it was first parsed, and only once the symbols blocking it have been defined."""
+        records = self.context.records
+        incomplete = []
+        for j in range(len(records)):
+            if records[j].isParseable() and not records[j].isComplete():
+                incomplete.append(j)
+        self.context.log(3, "updating %d incomplete parser records...", len(incomplete))
+        blocked = {}            # Incomplete records blocked by each undefined symbol.
+        undefRecords = []
+        worklist = []
+        for j in incomplete:
+            self._scheduleRecord(j, blocked, worklist)
+        for i in range(maxPasses):
+            if len(worklist) == 0:
+                break
+            self.context.passnum = i + 1
+            self.context.log(3, "re-encoding %d parser records", len(worklist))
+            worklist.sort()
+            retry = []
+            for j in worklist:
+                if not self._reencodeRecord(j):
+                    # Later records were encoded with a different state, so their snapshots cannot be used.
+                    self.context.log(3, "assembler state changed by record %d, replaying all records", j)
+                    self._replayRecords(maxPasses)
+                    return
+                if not records[j].isComplete():
+                    retry.append(j)
+            worklist = []
+            for j in retry:
+                if not self._scheduleRecord(j, blocked, None):
+                    undefRecords.append(j)
+            for symbol in blocked.keys():
+                entry = self.context.symtab.lookup(symbol)
+                if entry != None and entry.isComplete():
+                    for j in blocked.pop(symbol):
+                        self._scheduleRecord(j, blocked, worklist)
+        for symbol in blocked:
+            undefRecords.extend(blocked[symbol])
+        undefRecords.extend(worklist)
+        nUndefs = len(undefRecords)
+        self.context.log(3, "%d incomplete parser records", nUndefs)
+        if nUndefs == 0:
+            self.context.log(3, "all parser records complete")
+        else:
+            undefRecords.sort()
+            for j in undefRecords:
+                records[j].error("undefined symbol")
+                self.context.errors += 1
+            self.context.error("unable to resolve parser records, %d undefined records" % nUndefs, source=False, count=False)
+
+    def _scheduleRecord(self, recordIndex, blocked, worklist):
+        """Add an incomplete record to the list of records blocked by the first of its undefined symbols, or to the
+        worklist if none of them are undefined. Return False if it is neither blocked nor added to the worklist."""
+        blockers = self.context.records[recordIndex].blockers
+        if blockers:
+            for symbol in blockers:
+                entry = self.context.symtab.lookup(symbol)
+                if entry == None or not entry.isComplete():
+                    blocked.setdefault(symbol, []).append(recordIndex)
+                    return True
+        if worklist == None:
+            return False
+        worklist.append(recordIndex)
+        return True
+
+    def _reencodeRecord(self, recordIndex):
+        """Re-encode a parser record from its saved state. Return False if the resulting assembler state differs from
+        the state after the record was parsed in pass 1."""
+        record = self.context.records[recordIndex]
+        self.context.currentRecord = record
+        self.context.previousRecord = self.context.records[recordIndex - 1]
+        self.context.load(record)
+        self.context.loadState(record.state)
+        record.blockers = None
+        self.context.log(8, "resolve: %s", record.srcline)
+        self.parse(record.label, record.opcode, record.operands)
+        return (self.context.saveState() == record.exitState)
+
+    def _replayRecords(self, maxPasses):
+        "Re-parse every parseable record in program order, until all are complete or no progress is made."
         numRecords = len(self.context.records)
-        self.context.log(3, "updating %d parser records..." % (numRecords))
+        self.context.log(3, "updating %d parser records...", numRecords)
         nUndefs = nPrevUndefs = 0
         for i in range(maxPasses):
             self.context.passnum = i + 1
@@ -273,13 +349,13 @@ class Assembler:
                     self.context.currentRecord = record
                     self.context.previousRecord = self.context.records[j-1]
                     self.context.load(record)
-                    self.context.log(8, "resolve: %s" % (record.srcline))
+                    self.context.log(8, "resolve: %s", record.srcline)
                     self.parse(record.label, record.opcode, record.operands)
                     self.context.records[j] = self.context.currentRecord
                     if not record.isComplete():
                         nUndefs += 1
                         undefRecords.append(record)
-            self.context.log(3, "%d incomplete parser records" % (nUndefs))
+            self.context.log(3, "%d incomplete parser records", nUndefs)
             if nUndefs == 0:
                 self.context.log(3, "all parser records complete")
                 break
@@ -289,10 +365,6 @@ class Assembler:
                     self.context.errors += 1
                 self.context.error("no progress resolving parser records, %d undefined records" % nUndefs, source=False, count=False)
                 break
-        if self.context.debug:
-            endTime = time.time()
-            delta = endTime - startTime
-            print "Pass 2: %3.2f seconds" % delta
 
     def fatal(self, text, source=True):
         self.error(text, source, fatal=True)
@@ -345,6 +417,14 @@ class Assembler:
             print msg
         self.log(3, msg)
 
-    def log(self, level, text):
+    def log(self, level, text, *args):
+        # Formatting is deferred until the level is known to be enabled.
         if level <= self.context.logLevel:
+            startTime = time.time()
+            if args:
+                text = text % args
             print >>self.context.logfile, "[Pass %03d] %s" % (self.context.passnum + 1, text)
+            self.context.logTime += time.time() - startTime
+
+    def _nolog(self, level, text, *args):
+        pass
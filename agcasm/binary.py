@@ -18,40 +18,97 @@
 # along with this software; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
+import sys
 import struct
+import audioop
+from array import array
 from memory import MemoryType
 
 class ObjectCode:
-    """Class storing object code."""
+    """Class storing object code. The rope is held as a single array of 16-bit words, with the fixed banks in
+    the order they appear in the core image file."""
+
+    # Native (signed) value of each 15-bit ones' complement word.
+    NATIVE = array('h', [ n for n in range(040000) ] + [ -(077777 & ~n) for n in range(040000, 0100000) ])
 
     def __init__(self, context):
         self.context = context              # Assembler context.
-        self.objectCode = {}
+        self.banks = context.memmap.getBanks(MemoryType.FIXED)
+        self.bankStart = {}                 # Bank number -> index of the first word of the bank in the image.
+        self.bankSize = {}                  # Bank number -> number of words in the bank.
         self.buggerIndex = {}
+        self.dirty = set()                  # Banks changed since their bugger words were generated.
 
-        for bank in self.context.memmap.getBanks(MemoryType.FIXED):
-            self.objectCode[bank] = {}
-            for offset in range(self.context.getBankSize(MemoryType.FIXED, bank)):
-                self.objectCode[bank][offset] = 0
+        size = 0
+        for bank in self.banks:
+            self.bankStart[bank] = size
+            self.bankSize[bank] = context.getBankSize(MemoryType.FIXED, bank)
+            size += self.bankSize[bank]
+        self.image = array('H', [0]) * size
+
+        self.fill(context.records)
 
-        for i in range(len(self.context.records)):
-            record = self.context.records[i]
+    def fill(self, records):
+        "Copy the object code of the supplied parser records into the rope image."
+        image = self.image
+        memmap = self.context.memmap
+        bankStart = self.bankStart
+        for record in records:
             if record.isGenerative():
-                pa = record.address
-                (bank, offset) = context.memmap.pseudoToBankOffset(pa)
-                if record.code != None and len(record.code) > 0:
-                    if len(record.code) >= 1:
-                        self.objectCode[bank][offset] = record.code[0] & 077777
-                        #context.log(4, "code for %06o (%02o,%04o): %05o" % (pa, bank, offset, self.objectCode[bank][offset]))
-                    if len(record.code) == 2:
-                        self.objectCode[bank][offset+1] = record.code[1] & 077777
-                        #context.log(4, "code for %06o (%02o,%04o): %05o" % (pa, bank, offset+1, self.objectCode[bank][offset+1]))
+                code = record.code
+                if code != None and len(code) > 0:
+                    (bank, offset) = memmap.pseudoToBankOffset(record.address)
+                    index = bankStart[bank] + offset
+                    image[index] = code[0] & 077777
+                    if len(code) == 2:
+                        image[index + 1] = code[1] & 077777
+                    self.dirty.add(bank)
                 else:
-                    context.error("missing object code at address %06s" % (pa), source=False)
+                    self.context.error("missing object code at address %06s" % (record.address), source=False)
                     return
 
+    def getBank(self, bank):
+        "Return a copy of the words of the supplied bank, as an array."
+        start = self.bankStart[bank]
+        return self.image[start:start + self.bankSize[bank]]
+
+    def getBankRange(self, bank):
+        "Return the (start, end) indices of the supplied bank in the rope image."
+        start = self.bankStart[bank]
+        return (start, start + self.bankSize[bank])
+
+    def getWord(self, bank, offset):
+        return self.image[self.bankStart[bank] + offset]
+
+    def setWord(self, bank, offset, value):
+        self.image[self.bankStart[bank] + offset] = value
+        self.dirty.add(bank)
+
+    @classmethod
+    def sum(cls, words):
+        """Return the ones' complement sum of the supplied array of words, with overflow correction after each
+        addition, as ObjectCode.add() would. The correction makes the result depend on the order of the words,
+        not just on their total, so the words are summed in sequence, but as native integers."""
+        total = 0
+        for word in map(cls.NATIVE.__getitem__, words):
+            total += word
+            if total > 037777:
+                total -= 037777
+            elif total < -037777:
+                total += 037777
+        if total < 0:
+            total = (077777 & ~(-total))
+        return total
+
     def generateBuggers(self):
-        for bank in self.context.memmap.getBanks(MemoryType.FIXED):
+        """Add the bugger words (checksums) to each bank. Only banks changed by fill() or setWord() since the last
+        call are recomputed."""
+        image = self.image
+        for bank in self.banks:
+            if bank in self.buggerIndex and bank not in self.dirty:
+                continue
+            start = self.bankStart[bank]
+
             # Add bugger info to the bank.
             if bank == 2:
                 offset = 04000
@@ -63,25 +120,23 @@ class ObjectCode:
             count = self.context.getBankCount(MemoryType.FIXED, bank)
 
             if count < 01776:
-                self.objectCode[bank][count] = count + offset
-                self.context.log(4, "added word %05o at (%02o,%04o)" % (count + offset, bank, count + 02000))
+                image[start + count] = count + offset
+                self.context.log(4, "added word %05o at (%02o,%04o)", count + offset, bank, count + 02000)
                 count += 1
             if count < 01777:
-                self.objectCode[bank][count] = count + offset
-                self.context.log(4, "added word %05o at (%02o,%04o)" % (count + offset, bank, count + 02000))
+                image[start + count] = count + offset
+                self.context.log(4, "added word %05o at (%02o,%04o)", count + offset, bank, count + 02000)
                 count += 1
             if count < 02000:
-                bugger = 0
-                offset = 0
-                for offset in range(count):
-                    bugger = self.add(bugger, self.objectCode[bank][offset])
+                bugger = self.sum(image[start:start + count])
                 if (bugger & 040000) == 0:
                     guess = self.add(bank, 077777 & ~bugger)
                 else:
                     guess = self.add(077777 & ~bank, 077777 & ~bugger)
-                self.objectCode[bank][count] = guess
+                image[start + count] = guess
                 self.buggerIndex[bank] = count
-                self.context.log(4, "bugger word %05o at (%02o,%04o)" % (guess, bank, count + 02000))
+                self.context.log(4, "bugger word %05o at (%02o,%04o)", guess, bank, count + 02000)
+        self.dirty.clear()
 
     def writeUsage(self, listfile):
         for bank in self.context.memmap.getBanks(MemoryType.ERASABLE):
@@ -144,41 +199,63 @@ class ObjectCode:
                 break
         return data[index]
 
+    def getBytes(self):
+        """Return the rope image in core file format, i.e. each word shifted left one bit, big-endian.
+
+        The shift is done on the whole image at once by audioop, which treats the words as signed 16-bit samples.
+        Biasing them by -040000 keeps the doubled values in range, and the final bias restores them."""
+        data = audioop.bias(audioop.mul(audioop.bias(self.image.tostring(), 2, -040000), 2, 2), 2, 0100000)
+        if sys.byteorder == "little":
+            words = array('H', data)
+            words.byteswap()
+            data = words.tostring()
+        return data
+
     def write(self, outputfile):
-        count = 0
-        for bank in self.context.memmap.getBanks(MemoryType.FIXED):
-            self.context.log(4, "writing output for bank %02o (%d words)" % (bank, self.context.getBankSize(MemoryType.FIXED, bank)))
-            count += self.context.getBankSize(MemoryType.FIXED, bank)
-            for offset in range(self.context.getBankSize(MemoryType.FIXED, bank)):
-                value = self.objectCode[bank][offset]
-                value = value << 1
-                wordval = struct.pack(">H", value)
-                outputfile.write(wordval)
-        self.context.log(4, "wrote %d words" % (count))
+        "Write the rope image in core file format to a file object, in a single write."
+        self.context.log(4, "writing output for %d banks", len(self.banks))
+        outputfile.write(self.getBytes())
+        self.context.log(4, "wrote %d words", len(self.image))
+
+    def writeInto(self, buffer, offset=0):
+        """Write the rope image in core file format into a writable buffer, e.g. a bytearray or an mmap, at the
+        supplied byte offset. Return the number of bytes written."""
+        data = self.getBytes()
+        struct.pack_into("%ds" % len(data), buffer, offset, data)
+        self.context.log(4, "wrote %d words at offset %d", len(self.image), offset)
+        return len(data)
 
     def writeListing(self, listfile):
-        for bank in self.context.memmap.getBanks(MemoryType.FIXED):
-            gotBugger = False
-            size = self.context.getBankSize(MemoryType.FIXED, bank)
-            self.context.log(4, "writing rope listing for bank %02o (%d words)" % (bank, size))
-            buggerIndex = self.buggerIndex[bank]
+        lines = []
+        row = "%s" + 8 * "       %05o"
+        for bank in self.banks:
+            size = self.bankSize[bank]
+            self.context.log(4, "writing rope listing for bank %02o (%d words)", bank, size)
+            buggerIndex = self.buggerIndex.get(bank, -1)
+            data = self.getBank(bank)
             for offset in range(0, size, 8):
                 if bank == 2 or bank == 3:
                     text = "   %04o" % (bank * 02000 + offset)
                 else:
                     text = self.context.memmap.segmentedToString(bank, offset + 02000)
-                for i in range(8):
-                    if offset + i == buggerIndex:
-                        text += "  CKSM %05o" % self.objectCode[bank][offset+i]
-                        gotBugger = True
-                    else:
-                        if gotBugger:
+                if buggerIndex < 0 or buggerIndex >= offset + 8:
+                    # No bugger word in this row.
+                    text = row % ((text,) + tuple(data[offset:offset+8]))
+                elif buggerIndex < offset:
+                    text += 8 * "         @  "
+                else:
+                    for i in range(8):
+                        if offset + i == buggerIndex:
+                            text += "  CKSM %05o" % data[offset+i]
+                        elif offset + i > buggerIndex:
                             text += "         @  "
                         else:
-                            text += "       %05o" % self.objectCode[bank][offset+i]
-                print >>listfile, text
+                            text += "       %05o" % data[offset+i]
+                lines.append(text)
                 if (offset + 8) % 040 == 0:
-                    print >>listfile
+                    lines.append("")
                 if (offset + 8) % 0400 == 0:
-                    print >>listfile
+                    lines.append("")
+        if lines:
+            listfile.write("\n".join(lines) + "\n")
 
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+
+# Copyright 2010 Jim Lawton <jim dot lawton at gmail dot com>
+#
+# This file is part of pyagc.
+#
+# This is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import os
+import cPickle as pickle
+import hashlib
+from parser_record import ParserRecord
+from symbol_table import SymbolTableEntry
+
+class ModuleCacheEntry:
+    """Class storing the pass 1 output of a single source module."""
+
+    def __init__(self, digest, entryState, firstLine):
+        self.digest = digest            # Hash of the module source.
+        self.entryState = entryState    # Assembler state on entry to the module.
+        self.firstLine = firstLine      # Global line number on entry to the module.
+        self.exitState = None           # Assembler state on exit from the module.
+        self.numLines = 0               # Number of source lines in the module.
+        self.records = []               # Parser records, as tuples of slot values.
+        self.symbols = []               # Symbols defined by the module, as attribute dictionaries.
+        self.lookups = {}               # Symbols looked up by the module -> (defined, value) at the time.
+        self.unresolved = []            # Undefined symbols referenced by incomplete records.
+        self.currentIndex = None        # Index of the current record on exit, if it is in the module.
+        self.warnings = 0               # Number of warnings generated by the module.
+
+class ModuleCache:
+    """Cache of the pass 1 output of each source module, keyed by a hash of the module source and the assembler
+    state on entry. Only modules which do not include other modules are cached."""
+
+    VERSION = 1
+
+    # Record slots saved in the cache. The context is restored on load.
+    RECORD_SLOTS = tuple([ slot for slot in ParserRecord.__slots__ if slot != "context" ])
+
+    def __init__(self, context, filename):
+        self.context = context
+        self.filename = filename
+        self.modules = {}               # Module name -> pickled ModuleCacheEntry.
+        self.fingerprint = self._getFingerprint()
+        self.hits = 0
+        self.misses = 0
+        self.reason = None              # Reason the last lookup failed.
+        self.required = False           # Modules must be loaded from the cache, e.g. when linking.
+        self.current = None             # Entry being recorded, if any.
+        self.firstRecord = 0            # Index of the first record of the module being recorded.
+        self.errors = 0                 # Error count on entry to the module being recorded.
+        self.warnings = 0               # Warning count on entry to the module being recorded.
+        self.load()
+
+    def _getFingerprint(self):
+        """Return a hash of the assembler source and of the options which affect pass 1, so that the cache is
+        discarded when either changes."""
+        md5 = hashlib.md5()
+        md5.update(str(self.context.debug))
+        srcdir = os.path.dirname(os.path.abspath(__file__))
+        for filename in sorted(os.listdir(srcdir)):
+            if filename.endswith(".py"):
+                f = open(os.path.join(srcdir, filename), 'rb')
+                md5.update(f.read())
+                f.close()
+        return md5.hexdigest()
+
+    def load(self):
+        "Load the cache file, if it exists and was written by this version of the assembler."
+        self.modules = {}
+        if not os.path.isfile(self.filename):
+            return
+        try:
+            f = open(self.filename, 'rb')
+            try:
+                (version, fingerprint, modules) = pickle.load(f)
+            finally:
+                f.close()
+        except Exception:
+            self.context.log(3, "cache: unable to read %s, ignoring", self.filename)
+            return
+        if version == self.VERSION and fingerprint == self.fingerprint:
+            self.modules = modules
+
+    def save(self):
+        "Write the cache file."
+        f = open(self.filename, 'wb')
+        pickle.dump((self.VERSION, self.fingerprint, self.modules), f, pickle.HIGHEST_PROTOCOL)
+        f.close()
+
+    def getDigest(self, lines):
+        "Return the hash of the supplied module source lines."
+        return hashlib.md5("".join(lines)).hexdigest()
+
+    def getEntryState(self):
+        "Return the assembler state which affects the pass 1 output of a module."
+        context = self.context
+        return (context.saveState(), context.lastSuper, tuple(sorted(context.ebankloc.items())),
+                tuple(sorted(context.fbankloc.items())))
+
+    def lookup(self, modname, digest, entryState):
+        "Return the cached entry for the module, if it is valid in the current assembler state, otherwise None."
+        entry = None
+        self.reason = "not assembled"
+        data = self._read(modname)
+        if data != None:
+            entry = pickle.loads(data)
+            if entry.digest != digest:
+                self.reason = "source changed"
+                entry = None
+            elif entry.entryState != entryState:
+                self.reason = "entry bank/LOC state changed"
+                entry = None
+        if entry != None:
+            symbols = self.context.symtab.symbols
+            defined = set()
+            for attrs in entry.symbols:
+                if attrs["name"] in symbols:
+                    # Let the parser report the duplicate definition.
+                    self.reason = "symbol \"%s\" already defined" % attrs["name"]
+                    entry = None
+                    break
+                defined.add(attrs["name"])
+        if entry != None:
+            for (name, (wasDefined, value)) in entry.lookups.iteritems():
+                if name in defined:
+                    continue
+                symbol = symbols.get(name)
+                if (symbol != None) != wasDefined or (symbol != None and symbol.value != value):
+                    self.reason = "symbol \"%s\" changed" % name
+                    entry = None
+                    break
+        if entry == None:
+            self.context.log(3, "cache: %s not loaded, %s", modname, self.reason)
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def restore(self, modname, entry):
+        "Add the cached records and symbols of a module, and update the assembler state as if it had been parsed."
+        context = self.context
+        offset = context.global_linenum - entry.firstLine
+        records = []
+        for values in entry.records:
+            record = ParserRecord.__new__(ParserRecord)
+            for (slot, value) in zip(self.RECORD_SLOTS, values):
+                setattr(record, slot, value)
+            record.context = context
+            record.global_linenum += offset
+            records.append(record)
+        for attrs in entry.symbols:
+            symbol = SymbolTableEntry(context, attrs["name"])
+            symbol.__dict__.update(attrs)
+            symbol.recordIndex += offset
+            context.symtab.addEntry(symbol)
+        if entry.currentIndex != None:
+            context.previousRecord = context.currentRecord
+            context.currentRecord = records[entry.currentIndex]
+        context.records.extend(records)
+        (state, context.lastSuper, ebankloc, fbankloc) = entry.exitState
+        context.loadState(state)
+        context.ebankloc = dict(ebankloc)
+        context.fbankloc = dict(fbankloc)
+        context.srcfile = modname
+        context.linenum = entry.numLines
+        context.global_linenum += entry.numLines
+        context.warnings += entry.warnings
+        context.log(3, "cache: loaded %d records from %s, %d unresolved references", len(records), modname, len(entry.unresolved))
+
+    def begin(self, digest, entryState):
+        "Start recording the pass 1 output of a module."
+        self.current = ModuleCacheEntry(digest, entryState, self.context.global_linenum)
+        self.firstRecord = len(self.context.records)
+        self.errors = self.context.errors
+        self.warnings = self.context.warnings
+        self.context.symtab.lookups = self.current.lookups
+
+    def end(self, modname, numLines):
+        "Finish recording the pass 1 output of a module, and store it unless it generated errors."
+        context = self.context
+        entry = self.current
+        self.current = None
+        context.symtab.lookups = None
+        if context.errors != self.errors:
+            return
+        records = context.records[self.firstRecord:]
+        for (index, record) in enumerate(records):
+            entry.records.append(tuple([ getattr(record, slot) for slot in self.RECORD_SLOTS ]))
+            if record.label != None:
+                symbol = context.symtab.symbols.get(record.label)
+                if symbol != None and symbol.recordIndex == record.global_linenum - 1:
+                    attrs = dict(symbol.__dict__)
+                    del attrs["context"]
+                    entry.symbols.append(attrs)
+            if record is context.currentRecord:
+                entry.currentIndex = index
+            if record.blockers:
+                for symbol in record.blockers:
+                    if symbol not in entry.unresolved:
+                        entry.unresolved.append(symbol)
+        entry.numLines = numLines
+        entry.warnings = context.warnings - self.warnings
+        entry.exitState = self.getEntryState()
+        # Pickle now, as pass 2 updates records and symbols in place.
+        self._write(modname, pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+
+    def _read(self, modname):
+        "Return the pickled entry for the module, or None."
+        return self.modules.get(modname)
+
+    def _write(self, modname, data):
+        "Store the pickled entry for the module."
+        self.modules[modname] = data
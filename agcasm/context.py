@@ -20,7 +20,7 @@
 
 from memory import MemoryMap, MemoryType
 from opcode import OpcodeType
-from opcodes import OPCODES
+from opcodes import OPCODES, DISPATCH
 from symbol_table import SymbolTable
 from record_type import RecordType
 
@@ -36,7 +36,10 @@ class Context:
         self.binfile = binfile
         self.srcfile = None
         self.opcodes = OPCODES[self.arch]
+        self.dispatch = DISPATCH[self.arch]
         self.symtab = SymbolTable(self)
+        self.cache = None               # Pass 1 module cache, if enabled.
+        self.formatter = None           # Listing record formatter, see RecordFormatter.forContext().
         self.linenum = 0
         self.global_linenum = 0
         self.mode = OpcodeType.BASIC
@@ -76,11 +79,13 @@ class Context:
         #  7 - Parser operation.
         #  8 - Symbol resolution.
         self.logLevel = logLevel
+        self.logEnabled = [ level <= logLevel for level in range(max(9, logLevel + 1)) ]   # Per-level enable flags.
+        self.logTime = 0.0  # Time spent in enabled log calls.
 
         self.loc = 0        # Assembler PC, i.e. current position in erasable or fixed memory.
         self.ebank = 0      # Current E-Bank.
         self.fbank = 0      # Current F-Bank.
-        self.super = 0      # Superbank bit (0/1).
+        self.super = 1      # Superbank bit (0/1).
         self.lastSuper = 0
 
         self.ebankloc = {}  # Saved current location for each erasable bank.
@@ -204,18 +209,35 @@ class Context:
             record.ebank = self.ebank
             record.fbank = self.fbank
 
+    def saveState(self):
+        "Return a snapshot of the assembler state used to encode a parser record."
+        return (self.loc, self.mode, self.super, self.ebank, self.fbank, self.lastEbank,
+                self.previousWasEbankEquals, self.previousWasSbankEquals, self.previousWasIndex, self.complementNext,
+                self.interpMode, self.interpArgs, self.interpArgCount, tuple(self.interpArgTypes),
+                tuple(self.interpArgCodes), tuple(self.interpArgIncrement), self.indexed)
+
+    def loadState(self, state):
+        "Restore an assembler state snapshot returned by saveState()."
+        (self.loc, self.mode, self.super, self.ebank, self.fbank, self.lastEbank,
+         self.previousWasEbankEquals, self.previousWasSbankEquals, self.previousWasIndex, self.complementNext,
+         self.interpMode, self.interpArgs, self.interpArgCount, interpArgTypes,
+         interpArgCodes, interpArgIncrement, self.indexed) = state
+        self.interpArgTypes = list(interpArgTypes)
+        self.interpArgCodes = list(interpArgCodes)
+        self.interpArgIncrement = list(interpArgIncrement)
+
     def setLoc(self, loc):
         if not self.memmap.isValid(loc):
             self.error("trying to set loc to an invalid address (%06o)" % loc)
         if not self.reparse:
-            self.log(5, "changing loc from %06o to %06o" % (self.loc, loc))
+            self.log(5, "changing loc from %06o to %06o", self.loc, loc)
             self.loc = loc
 
     def incrLoc(self, delta):
         if not self.memmap.isValid(self.loc + delta):
             self.error("trying to set loc to an invalid address (%06o)" % (self.loc + delta))
         if not self.reparse:
-            self.log(5, "incrementing loc from %06o to %06o (delta=%04o)" % (self.loc, self.loc + delta, delta))
+            self.log(5, "incrementing loc from %06o to %06o (delta=%04o)", self.loc, self.loc + delta, delta)
             self.loc += delta
 
     def switchEBank(self, bank):
@@ -228,11 +250,11 @@ class Context:
         if bank != None and offset != None:
             if self.memmap.isErasable(self.loc):
                 if offset > self.ebankloc[bank]:
-                    self.log(4, "saving EB %02o: %04o -> %04o" % (bank, self.ebankloc[bank], offset))
+                    self.log(4, "saving EB %02o: %04o -> %04o", bank, self.ebankloc[bank], offset)
                     self.ebankloc[bank] = offset
             else:
                 if offset > self.fbankloc[bank]:
-                    self.log(4, "saving FB %02o: %04o -> %04o" % (bank, self.fbankloc[bank], offset))
+                    self.log(4, "saving FB %02o: %04o -> %04o", bank, self.fbankloc[bank], offset)
                     self.fbankloc[bank] = offset
         else:
             self.error("invalid address %06o" % self.loc)
@@ -242,7 +264,7 @@ class Context:
             self.lastEbank = self.ebank
             self.saveCurrentBank()
             self.ebank = self.memmap.pseudoToBank(pa)
-            self.log(4, "switched EB: %02o -> %02o" % (self.lastEbank, self.ebank))
+            self.log(4, "switched EB: %02o -> %02o", self.lastEbank, self.ebank)
             if self.memmap.isErasable(self.loc):
                 # Only change LOC if it is currently erasable. This allows us to move LOC up through the various
                 # erasable banks at the start as symbols are defined. Later, in fixed banks, you do not want an
@@ -257,7 +279,7 @@ class Context:
             if self.previousWasEbankEquals == True:
                 self.saveCurrentBank()
                 self.ebank = self.lastEbank
-                self.log(4, "reverted EB: %02o -> %02o" % (self.lastEbank, self.ebank))
+                self.log(4, "reverted EB: %02o -> %02o", self.lastEbank, self.ebank)
                 if self.memmap.isErasable(self.loc):
                     self.setLoc(self.memmap.segmentedToPseudo(MemoryType.ERASABLE, self.lastEbank, self.ebankloc[self.lastEbank]))
                 self.previousWasEbankEquals = False
@@ -268,7 +290,7 @@ class Context:
             if self.previousWasSbankEquals == True:
                 self.saveCurrentBank()
                 self.super = self.lastSuper
-                self.log(4, "reverted SB: %o -> %o" % (self.lastSuper, self.super))
+                self.log(4, "reverted SB: %o -> %o", self.lastSuper, self.super)
                 self.previousWasSbankEquals = False
 
     def switchFBank(self, bank=None):
@@ -277,12 +299,13 @@ class Context:
                 self.saveCurrentBank()
                 oldbank = self.fbank
                 self.fbank = bank
-                self.log(4, "switched FB: %02o -> %02o" % (oldbank, self.fbank))
+                self.log(4, "switched FB: %02o -> %02o", oldbank, self.fbank)
                 if bank > 037:
                     self.super = 1
                     self.log(3, "BANK: setting superbit to 1")
             self.setLoc(self.memmap.segmentedToPseudo(MemoryType.FIXED, self.fbank, self.fbankloc[self.fbank]))
-            self.log(4, "switched FB to %s" % (self.memmap.pseudoToSegmentedString(self.loc)))
+            if self.logEnabled[4]:
+                self.log(4, "switched FB to %s", self.memmap.pseudoToSegmentedString(self.loc))
 
     def getBankCount(self, memtype, bank):
         if memtype == MemoryType.ERASABLE:
@@ -294,6 +317,8 @@ class Context:
         return self.memmap.banks[memtype][bank].size
 
     def printBanks(self):
+        if not self.logEnabled[4]:
+            return
         text = "LOC=%06o EB=%02o FB=%02o SB=%o " % (self.loc, self.ebank, self.fbank, self.super)
         text += "EBs: "
         for eb in self.ebankloc.keys():
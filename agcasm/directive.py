@@ -23,6 +23,7 @@ from number import Decimal, DoubleDecimal, Octal, DoubleOctal
 from expression import Expression, AddressExpression, Number
 from opcode import Opcode
 from record_type import RecordType
+from memory import MemoryType
 
 # NOTE: Must be a new-style class.
 class Directive(Opcode):
@@ -53,12 +54,8 @@ class Directive(Opcode):
                     else:
                         context.error("missing operand")
 
-        try:
-            method = self.__getattribute__("parse_" + self.methodName)
-        except:
-            method = None
-        if method:
-            method(context, operands)
+        if self.handler:
+            self.handler(context, operands)
 
         context.currentRecord.type = self.type
         context.incrLoc(self.numwords)
@@ -66,12 +63,12 @@ class Directive(Opcode):
         if context.currentRecord.complete:
             if context.currentRecord.code: 
                 if len(context.currentRecord.code) == 1:
-                    context.log(5, "directive: generated code %05o" % (context.currentRecord.code[0]))
+                    context.log(5, "directive: generated code %05o", context.currentRecord.code[0])
                 else:
-                    context.log(5, "directive: generated code %05o %05o" % (context.currentRecord.code[0], context.currentRecord.code[1]))
+                    context.log(5, "directive: generated code %05o %05o", context.currentRecord.code[0], context.currentRecord.code[1])
         
         if self.numwords > 0 and context.interpArgs > 0:
-            context.log(5, "directive: incrementing interpArgCount: %d -> %d" % (context.interpArgCount, context.interpArgCount + 1))
+            context.log(5, "directive: incrementing interpArgCount: %d -> %d", context.interpArgCount, context.interpArgCount + 1)
             context.interpArgCount += 1
 
     def ignore(self, context):
@@ -146,9 +143,10 @@ class Directive(Opcode):
         expr = AddressExpression(context, operands)
         if expr.complete:
             pa = expr.value
+            (bankdesc, memtype, switched, offset) = context.memmap.classify(pa)
             word1 = context.memmap.pseudoToAddress(pa)
-            if context.memmap.isFixed(pa):
-                bank = context.memmap.getBankNumber(pa)
+            if memtype == MemoryType.FIXED:
+                bank = bankdesc.banknum
                 word2 = 0
                 # Bits 14:10 of the generated word contain the bank number.
                 if bank >= 040:
@@ -235,7 +233,7 @@ class Directive(Opcode):
             if bank == None or offset == None:
                 context.error("invalid address %06o" % pa)
             else:
-                if (context.passnum > 0 and context.memmap.isSwitched(pa) and bank != context.fbank and bank != context.ebank):
+                if (context.memmap.isSwitched(pa) and bank != context.fbank and bank != context.ebank):
                     context.error("bank (%02o) does not match current FB (%02o) or EB (%02o)" % (bank, context.fbank, context.ebank))
                 else:
                     context.currentRecord.code = [ context.memmap.pseudoToAddress(pa) ]
@@ -246,7 +244,7 @@ class Directive(Opcode):
     def parse_BANK(self, context, operands):
         if operands:
             expr = Expression(context, operands)
-            context.log(3, "BANK: \"%s\" (%06o)" % (operands, expr.value))
+            context.log(3, "BANK: \"%s\" (%06o)", operands, expr.value)
             if expr.complete:
                 context.switchFBank(expr.value)
                 context.currentRecord.target = context.loc
@@ -263,12 +261,14 @@ class Directive(Opcode):
         bank = None
         expr = AddressExpression(context, operands)
         if expr.complete:
-            if not context.memmap.isFixed(expr.value):
+            (bankdesc, memtype, switched, offset) = context.memmap.classify(expr.value)
+            if memtype != MemoryType.FIXED:
                 context.error("BBCON operand must be in fixed memory")
-            bank = context.memmap.getBankNumber(expr.value)
+            if bankdesc:
+                bank = bankdesc.banknum
             bbval = 0
             # Bits 14:10 of the generated word contain the bank number. Bit 15 is always zero.
-            context.log(3, "BBCON: bank=%o super=%d ebank=%o" % (bank, context.super, context.ebank))
+            context.log(3, "BBCON: bank=%o super=%d ebank=%o", bank, context.super, context.ebank)
             if bank >= 040:
                 bbval |= ((bank - 010) << 10)
             else:
@@ -319,7 +319,7 @@ class Directive(Opcode):
     def parse_BLOCK(self, context, operands):
         expr = Expression(context, operands)
         if expr.complete:
-            context.log(3, "BLOCK: %02o" % (expr.value))
+            context.log(3, "BLOCK: %02o", expr.value)
             bank = expr.value
             if bank == 0:
                 context.switchEBank(bank)
@@ -381,7 +381,7 @@ class Directive(Opcode):
             if bank == None or offset == None:
                 context.error("invalid address %06o" % pa)
             else:
-                if (context.passnum > 0 and context.memmap.isSwitched(pa) and bank != context.fbank and bank != context.ebank):
+                if (context.memmap.isSwitched(pa) and bank != context.fbank and bank != context.ebank):
                     context.error("bank (%02o) does not match current FB (%02o) or EB (%02o)" % (bank, context.fbank, context.ebank))
                 else:
                     context.currentRecord.code = [ 030000 + context.memmap.pseudoToAddress(pa) ]
@@ -396,7 +396,8 @@ class Directive(Opcode):
         if expr.complete:
             pa = expr.value
             if context.memmap.isErasable(pa):
-                context.log(3, "EBANK= %s" % context.memmap.pseudoToSegmentedString(pa))
+                if context.logEnabled[3]:
+                    context.log(3, "EBANK= %s", context.memmap.pseudoToSegmentedString(pa))
                 context.switchEBankPA(pa)
                 context.currentRecord.target = pa
                 context.currentRecord.operandType = expr.refType
@@ -410,7 +411,8 @@ class Directive(Opcode):
         expr = AddressExpression(context, operands)
         if expr.complete:
             pa = expr.value
-            context.log(3, "ECADR %s" % context.memmap.pseudoToSegmentedString(pa))
+            if context.logEnabled[3]:
+                context.log(3, "ECADR %s", context.memmap.pseudoToSegmentedString(pa))
             if context.memmap.isErasable(pa):
                 context.currentRecord.code = [ pa ]
                 context.currentRecord.operandType = expr.refType
@@ -475,8 +477,9 @@ class Directive(Opcode):
         expr = AddressExpression(context, operands)
         if expr.complete:
             pa = expr.value
-            if context.memmap.isFixed(pa):
-                (bank, offset) = context.memmap.pseudoToBankOffset(pa)
+            (bankdesc, memtype, switched, offset) = context.memmap.classify(pa)
+            if memtype == MemoryType.FIXED:
+                bank = bankdesc.banknum
                 if bank >= 040:
                     bank -= 010
                 word = ((bank) << 10) | offset
@@ -532,11 +535,12 @@ class Directive(Opcode):
         expr = AddressExpression(context, operands)
         if expr.complete:
             pa = expr.value
-            if context.memmap.isFixed(pa):
+            (bankdesc, memtype, switched, offset) = context.memmap.classify(pa)
+            if memtype == MemoryType.FIXED:
                 context.currentRecord.target = pa
                 context.currentRecord.operandType = expr.refType
                 context.currentRecord.complete = True
-                bank = context.memmap.pseudoToBank(pa)
+                bank = bankdesc.banknum
                 if bank <= 037:
                     context.super = 0
                     context.log(3, "SBANK=: setting superbit to 0")
@@ -549,15 +553,16 @@ class Directive(Opcode):
     def parse_SETLOC(self, context, operands):
         expr = AddressExpression(context, operands)
         if expr.value is None:
-            context.log(3, "SETLOC: \"%s\" (%s)" % (operands, expr.value))
+            context.log(3, "SETLOC: \"%s\" (%s)", operands, expr.value)
         else:
-            context.log(3, "SETLOC: \"%s\" (%06o)" % (operands, expr.value))
+            context.log(3, "SETLOC: \"%s\" (%06o)", operands, expr.value)
         if expr.complete:
             pa = expr.value
             context.currentRecord.target = pa
+            (bankdesc, memtype, switched, offset) = context.memmap.classify(pa)
             bank = context.memmap.pseudoToBank(pa)
-            context.log(3, "SETLOC: bank=%02o" % bank)
-            if context.memmap.isErasable(pa):
+            context.log(3, "SETLOC: bank=%02o", bank)
+            if memtype == MemoryType.ERASABLE:
                 context.switchEBank(bank)
             else:
                 context.switchFBank(bank)
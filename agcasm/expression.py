@@ -18,8 +18,9 @@
 # along with this software; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
+import re
 from number import Number
-from opcode import OperandType
+from lru import LRUCache
 from record_type import RecordType
 
 class ExpressionType:
@@ -40,9 +41,119 @@ class ExpressionType:
             text = "   "
         return text
 
+class OperandClass:
+    SYMBOL       = 0    # Symbol, defined or not.
+    NUMBER       = 1    # Numeric literal.
+    RELATIVE     = 2    # +N or -N relative to the current location, in address expressions.
+
+# NOTE: Must be a new-style class.
+class CompiledExpression(object):
+    """Operand expression compiled on first sight. The +N/-N forms are split, each operand is classified and the
+    numeric operands are converted and folded into a single constant, so that evaluating the expression only
+    requires looking up the symbols it refers to."""
+
+    __slots__ = [
+        "valid",        # False if the expression can never be complete, e.g. a malformed operand list.
+        "constant",     # Sum of the numeric operands.
+        "terms",        # (name, negate, symbolic) for each non-constant operand, in order.
+        "symbols",      # Symbols referenced, including malformed numbers, which are never defined.
+        "type",         # ExpressionType of a complete single-operand expression.
+        "relative",     # 1 or -1 for a single +N/-N address expression, otherwise 0.
+        "firstRef",     # Record type set by a leading numeric operand, or None.
+        "lastRef",      # Record type set by a trailing numeric operand, or None.
+        "errors",       # Syntax errors to report when the expression is parsed.
+        "cacheable",    # False if any operand is an invalid number, so that it is reported each time.
+    ]
+
+    def __init__(self, operands, addressExpr):
+        self.valid = False
+        self.constant = 0
+        self.terms = ()
+        self.symbols = ()
+        self.type = ExpressionType.NONE
+        self.relative = 0
+        self.firstRef = None
+        self.lastRef = None
+        self.errors = ()
+        self.cacheable = True
+
+        if operands == None or not 1 <= len(operands) <= 3:
+            self._addSymbols(operands, addressExpr)
+            return
+
+        errors = []
+        evaluated = [ (operands[0], False) ]
+        self.valid = True
+        if len(operands) == 2:
+            if operands[1].startswith('+') or operands[1].startswith('-'):
+                # Split a +N or -N operand.
+                operands = [ operands[0], operands[1][0], operands[1][1:] ]
+            else:
+                errors.append("second operand must be +number or -number")
+                self.valid = False
+        if len(operands) >= 2:
+            if operands[1] != '+' and operands[1] != '-':
+                errors.append("expression must be either addition (+) or subtraction (-)")
+        if len(operands) == 3:
+            evaluated.append((operands[2], operands[1] != '+'))
+        self.errors = tuple(errors)
+
+        terms = []
+        symbols = []
+        for (index, (operand, negate)) in enumerate(evaluated):
+            (opclass, value) = Expression.classifyOperand(operand, addressExpr)
+            if opclass == OperandClass.SYMBOL or value == None:
+                terms.append((operand, negate, opclass == OperandClass.SYMBOL))
+                if operand not in symbols:
+                    symbols.append(operand)
+                if value == None and opclass != OperandClass.SYMBOL:
+                    self.cacheable = False
+                continue
+            if negate:
+                self.constant -= value
+            else:
+                self.constant += value
+            if index == 0:
+                self.firstRef = RecordType.CONST
+            else:
+                self.lastRef = RecordType.CONST
+            if len(operands) == 1:
+                if opclass == OperandClass.RELATIVE:
+                    if operand.startswith('+'):
+                        self.relative = 1
+                    else:
+                        self.relative = -1
+                elif addressExpr:
+                    self.type = ExpressionType.CONSTANT
+        if len(operands) == 1 and self.type == ExpressionType.NONE and self.relative == 0:
+            self.type = ExpressionType.SYMBOLIC
+        self.terms = tuple(terms)
+        self.symbols = tuple(symbols)
+
+    def _addSymbols(self, operands, addressExpr):
+        "Record the symbols referenced by an operand list which cannot be evaluated as an expression."
+        symbols = []
+        if operands != None:
+            for operand in operands:
+                if operand == '+' or operand == '-':
+                    continue
+                (opclass, value) = Expression.classifyOperand(operand, addressExpr)
+                if (opclass == OperandClass.SYMBOL or value == None) and operand not in symbols:
+                    symbols.append(operand)
+        self.symbols = tuple(symbols)
+
 class Expression:
     """Class that represents an AGC expression."""
 
+    # Numeric literals: octal or decimal integers, or decimal fractions, with optional scale factors. The exponents
+    # are limited to two digits, so that any token matching this can be converted without overflow.
+    NUMBER_RE = re.compile("^(?:[0-9]+D?|[0-9]*\.[0-9]+)(?:E[+-]?[0-9]{1,2})?(?:B[+-]?[0-9]{1,2})?\*?$")
+
+    # LRU caches of classified operand tokens, (operand, addressExpr) -> (class, value), and of compiled
+    # expressions, (operands, addressExpr) -> CompiledExpression.
+    operandCache = LRUCache()
+    compiledCache = LRUCache()
+
     def __init__(self, context, operands, addressExpr=False, tryOnly=False):
         self.complete = False               # Expression complete, all references resolved.
         self.operands = operands            # List of operand fields.
@@ -52,87 +163,113 @@ class Expression:
         self.type = ExpressionType.NONE     # The type of the expression.
         self.length = 1                     # Length of the addressed quantity in words.
         self.refType = None                 # The type of the record symbol refers to.
+        self.undefined = []                 # Symbols referenced by the expression that are not yet defined.
 
-        self.context.log(5, "expression: operands=%s addressExpr=%s" % (operands, addressExpr))
-
-        op1 = 0
-        op2 = 0
-        op1type = None
-        op2type = None
-
-        if operands != None and 1 <= len(operands) <= 3:
-            if len(operands) >= 1:
-                operand = operands[0]
-                (op1, op1type) = self._parseOperand(operand)
-                if op1 != None:
-                    if len(operands) == 1:
-                        if self.addressExpr and op1type == OperandType.DECIMAL:
-                            if operands[0].startswith('+'):
-                                self.value = self.context.loc + op1
-                            elif operands[0].startswith('-'):
-                                self.value = self.context.loc - op1
-                            else:
-                                self.type = ExpressionType.CONSTANT
-                                self.value = op1
-                        else:
-                            self.value = op1
-                            self.type = ExpressionType.SYMBOLIC
-                        self.complete = True
-            if len(operands) >= 2:
-                if len(operands) == 2:
-                    if operands[1].startswith('+') or operands[1].startswith('-'):
-                        # Split a +N or -N operand.
-                        operands = [ operands[0], operands[1][0], operands[1][1:] ]
-                    else:
-                        if not tryOnly:
-                            self.context.syntax("second operand must be +number or -number")
-                if operands[1] != '+' and operands[1] != '-':
-                    if not tryOnly:
-                        self.context.syntax("expression must be either addition (+) or subtraction (-)")
-            if len(operands) == 3:
-                (op2, op2type) = self._parseOperand(operands[2])
-                if op1 != None and op2 != None:
-                    if operands[1] == '+':
-                        self.value = op1 + op2
-                    else:
-                        self.value = op1 - op2
-                    self.complete = True
+        self.context.log(5, "expression: operands=%s addressExpr=%s", operands, addressExpr)
+
+        compiled = Expression.compile(operands, addressExpr)
+        self.symbols = compiled.symbols     # Symbols referenced by the expression.
+        if not tryOnly:
+            for message in compiled.errors:
+                self.context.syntax(message)
+
+        value = compiled.constant
+        self.refType = compiled.firstRef
+        lookup = self.context.symtab.lookup
+        for (name, negate, symbolic) in compiled.terms:
+            entry = None
+            if symbolic:
+                entry = lookup(name)
+            if entry == None:
+                self.undefined.append(name)
+                continue
+            self.length = entry.length
+            self.refType = entry.type
+            if entry.value == None:
+                self.undefined.append(name)
+            elif negate:
+                value -= entry.value
+            else:
+                value += entry.value
+        if compiled.lastRef != None:
+            self.refType = compiled.lastRef
+        if compiled.valid and not self.undefined:
+            if compiled.relative != 0:
+                value = self.context.loc + compiled.relative * value
+            self.value = value
+            self.type = compiled.type
+            self.complete = True
 
         if self.complete == True:
-            if addressExpr:
-                self.context.log(5, "expression: complete, value=%05o (%s)" % (self.value, self.context.memmap.pseudoToSegmentedString(self.value)))
+            if addressExpr and self.context.logEnabled[5]:
+                self.context.log(5, "expression: complete, value=%05o (%s)", self.value, self.context.memmap.pseudoToSegmentedString(self.value))
             else:
-                self.context.log(5, "expression: complete, value=%05o" % (self.value))
+                self.context.log(5, "expression: complete, value=%05o", self.value)
         else:
             self.context.log(5, "expression: incomplete")
+            if self.undefined and not tryOnly:
+                record = self.context.currentRecord
+                if record.blockers == None:
+                    record.blockers = []
+                record.blockers.extend(self.undefined)
 
-    def _parseOperand(self, operand):
-        retval = None
-        rettype = OperandType.NONE
-
-        # First try symbol lookup.
-        entry = self.context.symtab.lookup(operand)
-        if entry != None:
-            retval = entry.value
-            rettype = OperandType.SYMBOLIC
-            self.length = entry.length
-            self.refType = entry.type
+    @classmethod
+    def compile(cls, operands, addressExpr=False):
+        "Return the compiled form of an operand list."
+        if operands == None:
+            key = (None, addressExpr)
         else:
-            tmpop = operand
-            if self.addressExpr and (operand.startswith('+') or operand.startswith('-')):
-                tmpop = operand[1:]
-            try:
-                # Next try number.
-                op = Number(tmpop)
-                if op.isValid():
-                    retval = op.value
-                    rettype = OperandType.DECIMAL
-                    self.refType = RecordType.CONST
-            except:
-                # Assume it is a symbol as yet undefined.
-                pass
-
-        return (retval, rettype)
+            key = (tuple(operands), addressExpr)
+        compiled = Expression.compiledCache.get(key)
+        if compiled == None:
+            compiled = CompiledExpression(operands, addressExpr)
+            if compiled.cacheable:
+                Expression.compiledCache.put(key, compiled)
+        return compiled
+
+    @classmethod
+    def classifyOperand(cls, operand, addressExpr=False):
+        """Classify an operand token as a symbol, a numeric literal or, in an address expression, a +N/-N relative
+        address, from its characters alone. Return (class, value), where value is the value of a numeric literal
+        or relative offset, or None if it is a symbol or an invalid number. Valid results are cached per token."""
+        key = (operand, addressExpr)
+        result = Expression.operandCache.get(key)
+        if result != None:
+            return result
+        opclass = OperandClass.SYMBOL
+        value = None
+        number = operand
+        if operand[:1] == '+' or operand[:1] == '-':
+            number = operand[1:]
+        if Expression.NUMBER_RE.match(number):
+            if number is operand:
+                opclass = OperandClass.NUMBER
+            elif addressExpr:
+                opclass = OperandClass.RELATIVE
+            else:
+                opclass = OperandClass.NUMBER
+                number = operand
+            op = Number(number)
+            if op.isValid():
+                value = op.value
+            else:
+                # Not cached, so that the error is reported each time.
+                return (opclass, None)
+        result = (opclass, value)
+        Expression.operandCache.put(key, result)
+        return result
+
+    @classmethod
+    def setCacheSize(cls, size):
+        "Set the maximum number of entries in each of the operand and compiled expression caches."
+        Expression.operandCache.setSize(size)
+        Expression.compiledCache.setSize(size)
+
+    @classmethod
+    def clearCache(cls):
+        "Empty the operand and compiled expression caches."
+        Expression.operandCache.clear()
+        Expression.compiledCache.clear()
 
     def __str__(self):
         text = "Expression: complete=%s" % str(self.complete)
@@ -21,7 +21,7 @@
 from opcode import Opcode, OpcodeType, OperandType
 from expression import AddressExpression
 from record_type import RecordType
-from memory import AddressType
+from memory import AddressType, MemoryType
 
 # NOTE: Must be a new-style class.
 class Instruction(Opcode):
@@ -62,24 +62,25 @@ class Instruction(Opcode):
                         else:
                             if context.debug:
                                 context.currentRecord.target = expr.value
+                            memtype = context.memmap.classify(pa)[1]
                             address = context.memmap.pseudoToAddress(pa)
                             if self.addressType == AddressType.FIXED_9:
-                                if context.memmap.isFixed(expr.value) or context.previousWasIndex == True:
+                                if memtype == MemoryType.FIXED or context.previousWasIndex == True:
                                     address &= 0777
                                 else:
                                     context.error("Address must be in fixed memory")
                             elif self.addressType == AddressType.FIXED_12:
-                                if context.memmap.isFixed(expr.value) or context.previousWasIndex == True:
+                                if memtype == MemoryType.FIXED or context.previousWasIndex == True:
                                     address &= 07777
                                 else:
                                     context.error("Address must be in fixed memory")
                             elif self.addressType == AddressType.ERASABLE_10:
-                                if context.memmap.isErasable(expr.value) or context.previousWasIndex == True:
+                                if memtype == MemoryType.ERASABLE or context.previousWasIndex == True:
                                     address &= 01777
                                 else:
                                     context.error("Address must be in erasable memory")
                             elif self.addressType == AddressType.ERASABLE_12:
-                                if context.memmap.isErasable(expr.value) or context.previousWasIndex == True:
+                                if memtype == MemoryType.ERASABLE or context.previousWasIndex == True:
                                     address &= 07777
                                 else:
                                     context.error("Address must be in erasable memory")
@@ -95,12 +96,8 @@ class Instruction(Opcode):
                 else:
                     context.error("missing operand")
 
-        try:
-            method = self.__getattribute__("parse_" + self.methodName)
-        except:
-            method = None
-        if method:
-            method(context, operands)
+        if self.handler:
+            self.handler(context, operands)
 
         context.currentRecord.type = self.type
         context.incrLoc(self.numwords)
@@ -114,9 +111,9 @@ class Instruction(Opcode):
 
         if context.currentRecord.complete:
             if self.numwords == 1:
-                context.log(5, "generated code %05o" % (context.currentRecord.code[0]))
+                context.log(5, "generated code %05o", context.currentRecord.code[0])
             else:
-                context.log(5, "generated code %05o %05o" % (context.currentRecord.code[0], context.currentRecord.code[1]))
+                context.log(5, "generated code %05o %05o", context.currentRecord.code[0], context.currentRecord.code[1])
 
     def parse_EXTEND(self, context, operands):
         context.mode = OpcodeType.EXTENDED
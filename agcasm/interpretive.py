@@ -84,16 +84,16 @@ class Interpretive(Opcode):
                 # Store/loads seem to increment all their operands.
                 if self.increment:
                     context.interpArgIncrement[0] = self.increment
-                    context.log(5, "interpretive: opcode increment operand %d" % 0)
+                    context.log(5, "interpretive: opcode increment operand %d", 0)
                     if self.numOperands > 1:
                         context.interpArgIncrement[1] = self.increment
-                        context.log(5, "interpretive: opcode increment operand %d" % 1)
+                        context.log(5, "interpretive: opcode increment operand %d", 1)
             else:
                 # Other opcodes only increment the first operand.
                 if self.increment:
                     context.interpArgIncrement[0] = self.increment
-                    context.log(5, "interpretive: opcode increment operand %d" % 0)
-            context.log(5, "interpArgIncrement: %s" % (context.interpArgIncrement))
+                    context.log(5, "interpretive: opcode increment operand %d", 0)
+            context.log(5, "interpArgIncrement: %s", context.interpArgIncrement)
 
         if self.mnemonic == "EXIT":
             exitInterp = True
@@ -115,7 +115,7 @@ class Interpretive(Opcode):
             context.log(5, "interpretive: packing type [OPCODE,0]")
             context.currentRecord.packingType = PackingType.OPCODE_ONLY
             context.currentRecord.operandType = RecordType.NONE
-            context.log(5, "interpretive: %s (%03o)" % (self.mnemonic, self.opcode))
+            context.log(5, "interpretive: %s (%03o)", self.mnemonic, self.opcode)
         elif oplen == 1:
             if operands[0] in context.opcodes[OpcodeType.INTERPRETIVE]:
                 # Case 2
@@ -124,7 +124,7 @@ class Interpretive(Opcode):
                 context.currentRecord.operandType = RecordType.NONE
                 mnemonic2 = operands[0]
                 opobj = context.opcodes[OpcodeType.INTERPRETIVE][operands[0]]
-                context.log(5, "interpretive: %s (%03o), %s (%03o)" % (self.mnemonic, self.opcode, opobj.mnemonic, opobj.opcode))
+                context.log(5, "interpretive: %s (%03o), %s (%03o)", self.mnemonic, self.opcode, opobj.mnemonic, opobj.opcode)
                 opcodes.append(opobj.opcode)
                 numArgs2 = opobj.numOperands
             else:
@@ -147,10 +147,10 @@ class Interpretive(Opcode):
         if numArgs > 0:
             if context.interpArgs < 4:
                 if (context.interpArgs + numArgs) <= 4:
-                    context.log(5, "interpretive: incrementing interpArgs, %d -> %d" % (context.interpArgs, context.interpArgs + numArgs))
+                    context.log(5, "interpretive: incrementing interpArgs, %d -> %d", context.interpArgs, context.interpArgs + numArgs)
                     context.interpArgs += numArgs
                 else:
-                    context.log(5, "interpretive: incrementing interpArgs, %d -> %d" % (context.interpArgs, 4))
+                    context.log(5, "interpretive: incrementing interpArgs, %d -> %d", context.interpArgs, 4)
                     context.interpArgs = 4
 
         # FIXME: Should this be done after parsing first opcode?
@@ -160,29 +160,21 @@ class Interpretive(Opcode):
                 isStore = True
             Interpretive._parseOperand(context, operands, embedded=True, store=isStore)
 
-        try:
-            method = self.__getattribute__("parse_" + self.methodName)
-        except:
-            method = None
-        if method:
-            method(context, operands)
+        if self.handler:
+            self.handler(context, operands)
 
         if mnemonic2 != None:
             if numArgs2 > 0:
                 if context.interpArgs < 4:
                     if (context.interpArgs + numArgs2) <= 4:
-                        context.log(5, "interpretive: incrementing interpArgs, %d -> %d" % (context.interpArgs, context.interpArgs + numArgs2))
+                        context.log(5, "interpretive: incrementing interpArgs, %d -> %d", context.interpArgs, context.interpArgs + numArgs2)
                         context.interpArgs += numArgs2
                     else:
-                        context.log(5, "interpretive: incrementing interpArgs, %d -> %d" % (context.interpArgs, 4))
+                        context.log(5, "interpretive: incrementing interpArgs, %d -> %d", context.interpArgs, 4)
                         context.interpArgs = 4
-            try:
-                method = opobj.__getattribute__("parse_" + opobj.methodName)
-            except:
-                method = None
-            if method:
+            if opobj.handler:
                 operands = operands[1:]
-                method(context, operands)
+                opobj.handler(context, operands)
             if mnemonic2 == "EXIT":
                 exitInterp = True
 
@@ -194,25 +186,25 @@ class Interpretive(Opcode):
                     acindex = context.interpArgs - 1
                 if opobj.increment:
                     context.interpArgIncrement[acindex] = opobj.increment
-                    context.log(5, "interpretive: opcode increment first operand set [%d]" % (acindex))
-                    context.log(5, "interpArgIncrement: %s" % (context.interpArgIncrement))
+                    context.log(5, "interpretive: opcode increment first operand set [%d]", acindex)
+                    context.log(5, "interpArgIncrement: %s", context.interpArgIncrement)
 
         code = opcodes[0] + 1
         if len(opcodes) == 2:
             code += (opcodes[1] + 1) * 0200
-            context.log(5, "interpretive: opcodes %03o %03o" % (opcodes[0], opcodes[1]))
+            context.log(5, "interpretive: opcodes %03o %03o", opcodes[0], opcodes[1])
         else:
-            context.log(5, "interpretive: opcode %03o" % (opcodes[0]))
+            context.log(5, "interpretive: opcode %03o", opcodes[0])
             if context.currentRecord.code:
                 operandcode = context.currentRecord.code[0]
-                context.log(5, "interpretive: operand %05o" % (operandcode))
+                context.log(5, "interpretive: operand %05o", operandcode)
                 code = (opcodes[0] + operandcode) & 077777
 
-        context.log(5, "interpretive: generated %05o" % code)
+        context.log(5, "interpretive: generated %05o", code)
 
         if self.complement:
             code = ~code & 077777
-            context.log(5, "interpretive: complemented to %05o " % (code))
+            context.log(5, "interpretive: complemented to %05o ", code)
 
         context.currentRecord.code = [ code ]
         context.currentRecord.complete = True
@@ -232,12 +224,12 @@ class Interpretive(Opcode):
 
     @classmethod
     def _parseOperand(cls, context, operands, embedded=False, store=False):
-        context.log(5, "interpretive: trying to parse operand %d %s" % (context.interpArgCount, operands))
+        context.log(5, "interpretive: trying to parse operand %d %s", context.interpArgCount, operands)
         newoperands = []
         indexreg = 0
         for operand in operands:
             if operand.endswith(',1') or operand.endswith(',2'):
-                context.log(5, "interpretive: indexed operand %s" % operand)
+                context.log(5, "interpretive: indexed operand %s", operand)
                 if operand.endswith(',1'):
                     indexreg = 1
                 else:
@@ -255,7 +247,7 @@ class Interpretive(Opcode):
                 # Switch or shift operand.
                 if context.currentRecord.interpArgType == InterpretiveType.SWITCH:
                     context.currentRecord.argcode = context.interpArgCodes[acindex]
-                    context.log(5, "interpretive: switch operand, value=%05o [%d] argcode=%05o" % (operand.value, acindex, context.interpArgCodes[acindex]))
+                    context.log(5, "interpretive: switch operand, value=%05o [%d] argcode=%05o", operand.value, acindex, context.interpArgCodes[acindex])
                     context.currentRecord.interpArgIncrement = context.interpArgIncrement[acindex]
                     # Switch operands use the encoding 0WWWWWWNNNNBBBB, where:
                     #  WWWWWW (6 bits) is the quotient when the constant value is divided by 15.
@@ -264,36 +256,36 @@ class Interpretive(Opcode):
                     flag = (operand.value / 15) & 077
                     bit = (operand.value % 15)
                     code = (flag << 8) | bit | (context.currentRecord.argcode << 4)
-                    context.log(5, "interpretive: switch operand, flag=%03o bit=%02o code=%05o" % (flag, bit, code))
+                    context.log(5, "interpretive: switch operand, flag=%03o bit=%02o code=%05o", flag, bit, code)
                 elif context.currentRecord.interpArgType == InterpretiveType.SHIFT:
                     if operand.value < 0:
                         code = (~abs(operand.value) + 1) & 077777
                     else:
                         code = operand.value
-                    context.log(5, "interpretive: shift operand, code=%05o [%d] argcode=%05o" % (code, acindex, context.interpArgCodes[acindex]))
+                    context.log(5, "interpretive: shift operand, code=%05o [%d] argcode=%05o", code, acindex, context.interpArgCodes[acindex])
                     context.currentRecord.argcode = context.interpArgCodes[acindex]
                     context.currentRecord.interpArgIncrement = context.interpArgIncrement[acindex]
                     code += (context.interpArgCodes[acindex] << 6)
                     code &= 077777
-                    context.log(5, "interpretive: shift operand, |=%05o, code=%05o" % (context.interpArgCodes[acindex] << 6, code))
+                    context.log(5, "interpretive: shift operand, |=%05o, code=%05o", context.interpArgCodes[acindex] << 6, code)
                 elif context.currentRecord.interpArgType == InterpretiveType.INDEX:
                     code = context.memmap.pseudoToInterpretiveAddress(operand.value)
-                    context.log(5, "interpretive: index operand, value=%05o [%d] code=%05o" % (operand.value, acindex, code))
+                    context.log(5, "interpretive: index operand, value=%05o [%d] code=%05o", operand.value, acindex, code)
                 elif context.currentRecord.interpArgType == InterpretiveType.BRANCH:
                     if operand.value < 0:
                         code = (operand.value - 1) & 077777
                     else:
                         code = context.memmap.pseudoToInterpretiveAddress(operand.value, size=15)
-                    context.log(5, "interpretive: branch operand, value=%05o [%d] code=%05o" % (operand.value, acindex, code))
+                    context.log(5, "interpretive: branch operand, value=%05o [%d] code=%05o", operand.value, acindex, code)
                 else:
                     context.error("invalid interpretive argument type")
             else:
                 if operand.value >= 0:
                     code = context.memmap.pseudoToInterpretiveAddress(operand.value)
-                    context.log(5, "interpretive: positive normal operand [%d] code=%05o" % (acindex, code))
+                    context.log(5, "interpretive: positive normal operand [%d] code=%05o", acindex, code)
                 else:
                     code = operand.value
-                    context.log(5, "interpretive: negative normal operand [%d] value=%05o" % (acindex, code))
+                    context.log(5, "interpretive: negative normal operand [%d] value=%05o", acindex, code)
 
             if store and indexreg > 0:
                 if indexreg == 1:
@@ -304,17 +296,17 @@ class Interpretive(Opcode):
             if context.interpArgIncrement[acindex] == True:
                 code += 1
                 code &= 077777
-                context.log(5, "interpretive: operand increment set [%d] code=%05o" % (acindex, code))
+                context.log(5, "interpretive: operand increment set [%d] code=%05o", acindex, code)
 
             if context.currentRecord.packingType == PackingType.OPERAND_ONLY and (indexreg == 2 or context.complementNext):
                 code = ~code & 077777
-                context.log(5, "interpretive: indexed X2 or complementNext, code=%05o" % (code))
+                context.log(5, "interpretive: indexed X2 or complementNext, code=%05o", code)
                 if context.complementNext:
                     context.complementNext = False
 
             context.currentRecord.code = [ code ]
             context.currentRecord.complete = True
-            context.log(5, "interpretive: generated operand %05o" % code)
+            context.log(5, "interpretive: generated operand %05o", code)
         else:
             context.log(5, "interpretive: operand undefined")
 
@@ -322,10 +314,10 @@ class Interpretive(Opcode):
             context.incrLoc(1)
 
         if context.interpArgCount < 4:
-            context.log(5, "interpretive: incrementing interpArgCount, %d -> %d" % (context.interpArgCount, context.interpArgCount + 1))
+            context.log(5, "interpretive: incrementing interpArgCount, %d -> %d", context.interpArgCount, context.interpArgCount + 1)
             context.interpArgCount += 1
         if context.interpArgCount == context.interpArgs:
-            context.log(5, "interpretive: all args found, resetting interpArgs, %d -> %d" % (context.interpArgs, 0))
+            context.log(5, "interpretive: all args found, resetting interpArgs, %d -> %d", context.interpArgs, 0)
             context.interpArgs = 0
             context.interpArgCount = 0
 
@@ -354,7 +346,7 @@ class Interpretive(Opcode):
         # STCALL's 2nd operand is branch address.
         acindex = context.interpArgs - 1
         context.interpArgTypes[acindex] = InterpretiveType.BRANCH
-        context.log(5, "interpretive: STCALL branch detected, [%d]" % (acindex))
+        context.log(5, "interpretive: STCALL branch detected, [%d]", acindex)
 
     def parse_StoreLoad(self, context, operands):
         if context.complementNext:
@@ -369,7 +361,7 @@ class Interpretive(Opcode):
 
     def parse_Switch(self, context, operands):
         # Store argcode in appropriate slot in context.interpArgCodes.
-        context.log(5, "interpretive: switch, %d operands" % (self.numOperands))
+        context.log(5, "interpretive: switch, %d operands", self.numOperands)
         if self.numOperands > 0:
             # First operand is the switch flag.
             if self.numOperands == 2:
@@ -378,11 +370,11 @@ class Interpretive(Opcode):
                 acindex = context.interpArgs - 1
             context.interpArgCodes[acindex] = self.switchcode
             context.interpArgTypes[acindex] = InterpretiveType.SWITCH
-            context.log(5, "interpretive: switch detected, [%d]=%05o" % (acindex, context.interpArgCodes[acindex]))
+            context.log(5, "interpretive: switch detected, [%d]=%05o", acindex, context.interpArgCodes[acindex])
             if self.numOperands == 2:
                 # Second operand (if any) is the branch address.
                 context.interpArgTypes[acindex+1] = InterpretiveType.BRANCH
-                context.log(5, "interpretive: switch branch detected, [%d]" % (acindex+1))
+                context.log(5, "interpretive: switch branch detected, [%d]", acindex+1)
 
     def parse_Shift(self, context, operands):
         # Store switch code in appropriate slot in context.interpArgCodes.
@@ -390,10 +382,10 @@ class Interpretive(Opcode):
             acindex = context.interpArgs - 1
             context.interpArgCodes[acindex] = self.switchcode
             context.interpArgTypes[acindex] = InterpretiveType.SHIFT
-            context.log(5, "interpretive: shift detected, [%d]=%05o" % (acindex, context.interpArgCodes[acindex]))
+            context.log(5, "interpretive: shift detected, [%d]=%05o", acindex, context.interpArgCodes[acindex])
 
     def parse_Index(self, context, operands):
-        context.log(5, "interpretive: index, %d operands" % (self.numOperands))
+        context.log(5, "interpretive: index, %d operands", self.numOperands)
         if self.numOperands > 0:
             if self.numOperands == 2:
                 acindex = context.interpArgs - 2
@@ -401,10 +393,10 @@ class Interpretive(Opcode):
                 acindex = context.interpArgs - 1
             context.interpArgCodes[acindex] = 0
             context.interpArgTypes[acindex] = InterpretiveType.INDEX
-            context.log(5, "interpretive: index detected, [%d]=%05o" % (acindex, context.interpArgCodes[acindex]))
+            context.log(5, "interpretive: index detected, [%d]=%05o", acindex, context.interpArgCodes[acindex])
 
     def parse_Branch(self, context, operands):
-        context.log(5, "interpretive: branch, %d operands" % (self.numOperands))
+        context.log(5, "interpretive: branch, %d operands", self.numOperands)
         if self.numOperands > 0:
             # First operand is the branch address.
             if self.numOperands == 2:
@@ -413,17 +405,17 @@ class Interpretive(Opcode):
                 acindex = context.interpArgs - 1
             context.interpArgCodes[acindex] = 0
             context.interpArgTypes[acindex] = InterpretiveType.BRANCH
-            context.log(5, "interpretive: branch detected, [%d]=%05o" % (acindex, context.interpArgCodes[acindex]))
+            context.log(5, "interpretive: branch detected, [%d]=%05o", acindex, context.interpArgCodes[acindex])
 
     def parse_SSP(self, context, operands):
         # SSP's 2nd operand is branch address.
         acindex = context.interpArgs - 1
         context.interpArgTypes[acindex] = InterpretiveType.BRANCH
-        context.log(5, "interpretive: SSP address operand detected, [%d]" % (acindex))
+        context.log(5, "interpretive: SSP address operand detected, [%d]", acindex)
 
     def parse_AXT(self, context, operands):
         # AXT's operand is branch address.
         acindex = context.interpArgs - 1
         context.interpArgTypes[acindex] = InterpretiveType.BRANCH
-        context.log(5, "interpretive: AXT address operand detected, [%d]" % (acindex))
+        context.log(5, "interpretive: AXT address operand detected, [%d]", acindex)
 
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+# Copyright 2010 Jim Lawton <jim dot lawton at gmail dot com>
+#
+# This file is part of pyagc.
+#
+# This is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import os
+import re
+import sys
+import time
+from number import Number
+from record_type import RecordType
+
+# NOTE: Must be a new-style class.
+class Lexer(object):
+    """Fixed-column lexer for AGC source lines.
+
+    Labels start in column 0, opcodes at column 16 and operands at column 24. Each line is tokenized in a
+    single pass into a tuple of (type, srcline, label, pseudolabel, opcode, operands, comment, opcolumn),
+    where srcline is the tab-expanded line and opcolumn is the column of the opcode in srcline, or -1."""
+
+    TOKEN_RE       = re.compile("\S+")
+    PSEUDOLABEL_RE = re.compile("^[+-][0-9]+$")
+
+    def lex(self, line):
+        "Tokenize a source line, which must not include the line terminator."
+        srcline = line.expandtabs(8)
+
+        if line.startswith('$'):
+            return (RecordType.INCLUDE, srcline, None, None, None, line[1:].split(), None, -1)
+
+        comment = None
+        hashpos = srcline.find('#')
+        if hashpos == -1:
+            tokens = self.TOKEN_RE.findall(srcline)
+            if not tokens:
+                return (RecordType.BLANK, srcline, None, None, None, None, None, -1)
+            code = srcline
+        else:
+            code = srcline[:hashpos]
+            tokens = self.TOKEN_RE.findall(code)
+            if not tokens:
+                return (RecordType.COMMENT, srcline, None, None, None, None, line, -1)
+            comment = line[line.index('#'):]
+
+        label = None
+        pseudolabel = None
+        first = tokens[0]
+        start = 0
+        if line[0] != ' ' and line[0] != '\t':
+            if (first[0] == '+' or first[0] == '-') and self.isPseudoLabel(first):
+                pseudolabel = first
+            else:
+                label = first
+                if len(tokens) == 1:
+                    return (RecordType.LABEL, srcline, label, None, None, None, comment, -1)
+            start = len(first)
+            del tokens[0]
+        elif (first[0] == '+' or first[0] == '-') and line.lstrip(' ')[0] == first[0]:
+            # Pseudo-labels may also be indented with spaces.
+            pseudolabel = first
+            start = code.find(first) + len(first)
+            del tokens[0]
+
+        if not tokens:
+            return (RecordType.NONE, srcline, label, pseudolabel, None, None, comment, -1)
+
+        opcode = tokens[0]
+        opcolumn = code.find(opcode, start)
+        operands = None
+        if len(tokens) > 1:
+            operands = tokens[1:]
+        return (RecordType.NONE, srcline, label, pseudolabel, opcode, operands, comment, opcolumn)
+
+    def isPseudoLabel(self, text):
+        "Return True if the supplied label field is a pseudo-label, i.e. [+-]number."
+        if self.PSEUDOLABEL_RE.match(text):
+            return True
+        return Number(text[1:]).isValid()
+
+def benchmark(filenames, repeat=1):
+    "Lex the supplied source files, following includes, and return (lines, seconds)."
+    lines = []
+    pending = list(filenames)
+    while pending:
+        filename = pending.pop(0)
+        sfile = open(filename)
+        for line in sfile.readlines():
+            if line.endswith('\n'):
+                line = line[:-1]
+            lines.append(line)
+            if line.startswith('$'):
+                modname = line[1:].split()[0]
+                if os.path.isfile(modname):
+                    pending.append(modname)
+        sfile.close()
+
+    lexer = Lexer()
+    lex = lexer.lex
+    startTime = time.time()
+    for i in range(repeat):
+        for line in lines:
+            lex(line)
+    return (len(lines) * repeat, time.time() - startTime)
+
+if __name__=="__main__":
+    from optparse import OptionParser
+
+    parser = OptionParser("usage: %prog [options] src_file [src_file...]")
+    parser.add_option("-n", "--repeat", dest="repeat", type="int", default=10, help="Number of times to lex the source, default 10.")
+    (options, args) = parser.parse_args()
+    if len(args) < 1:
+        parser.error("At least one source file must be supplied!")
+        sys.exit(1)
+
+    (numlines, delta) = benchmark(args, options.repeat)
+    if delta > 0:
+        print "Lexed %d lines in %3.2f seconds, %d lines/sec" % (numlines, delta, numlines / delta)
+    else:
+        print "Lexed %d lines in %3.2f seconds" % (numlines, delta)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+# Copyright 2010 Jim Lawton <jim dot lawton at gmail dot com>
+#
+# This file is part of pyagc.
+#
+# This is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import sys
+import time
+from parser_record import RecordFormatter
+
+# NOTE: Must be a new-style class.
+class ListingWriter(object):
+    """Buffered listing writer. Text is collected in memory and written to the output file in large chunks.
+
+    Parser records are formatted by a RecordFormatter, producing the same text as str(record). The writer can also
+    be used as a file object, e.g. with print >>."""
+
+    BUFSIZE = 65536
+
+    def __init__(self, context, outfile, bufsize=BUFSIZE):
+        self.context = context
+        self.outfile = outfile
+        self.bufsize = bufsize
+        self.buffer = []
+        self.size = 0
+        self.lines = 0                      # Number of records written.
+        self.formatter = RecordFormatter.forContext(context)
+        self.softspace = 0                  # Used by print >>.
+
+    def write(self, text):
+        self.buffer.append(text)
+        self.size += len(text)
+        if self.size >= self.bufsize:
+            self.flush()
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        if self.buffer:
+            self.outfile.write("".join(self.buffer))
+            self.buffer = []
+            self.size = 0
+
+    def close(self):
+        self.flush()
+        self.outfile.close()
+
+    def writeRecords(self, records):
+        "Write the listing lines for the supplied parser records."
+        self.formatter.update()
+        format = self.formatter.format
+        buffer = []
+        size = 0
+        for record in records:
+            format(record, buffer)
+            buffer.append('\n')
+            size += 1
+            if size >= 1024:
+                self.write("".join(buffer))
+                buffer = []
+                size = 0
+        if buffer:
+            self.write("".join(buffer))
+        self.lines += len(records)
+
+def benchmark(context, repeat=1):
+    "Render the listing of the assembled records, and return (lines, seconds)."
+    class NullFile:
+        def write(self, text):
+            pass
+        def close(self):
+            pass
+
+    writer = ListingWriter(context, NullFile())
+    startTime = time.time()
+    for i in range(repeat):
+        writer.writeRecords(context.records)
+    writer.flush()
+    return (len(context.records) * repeat, time.time() - startTime)
+
+if __name__=="__main__":
+    import os
+    from optparse import OptionParser
+    import api
+
+    parser = OptionParser("usage: %prog [options] src_file")
+    parser.add_option("-n", "--repeat", dest="repeat", type="int", default=10, help="Number of times to render the listing, default 10.")
+    parser.add_option("-d", "--debug",  action="store_true", dest="debug", default=False, help="Render the debug listing format.")
+    (options, args) = parser.parse_args()
+    if len(args) != 1:
+        parser.error("A source file must be supplied!")
+        sys.exit(1)
+
+    srcdir = os.path.dirname(args[0])
+    def loadSource(modname):
+        filename = os.path.join(srcdir, modname)
+        if not os.path.isfile(filename):
+            return None
+        return open(filename).read()
+
+    result = api.assemble(loadSource, os.path.basename(args[0]), debug=options.debug)
+    (numlines, delta) = benchmark(result.context, options.repeat)
+    if delta > 0:
+        print "Rendered %d lines in %3.2f seconds, %d lines/sec" % (numlines, delta, numlines / delta)
+    else:
+        print "Rendered %d lines in %3.2f seconds" % (numlines, delta)
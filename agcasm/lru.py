@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+# Copyright 2010 Jim Lawton <jim dot lawton at gmail dot com>
+#
+# This file is part of pyagc.
+#
+# This is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+class LRUCache:
+    """Bounded cache. When it is full, the least recently used quarter of the entries is evicted. None cannot be
+    stored, as get() returns None for a missing key."""
+
+    def __init__(self, size=4096):
+        self.size = size                    # Maximum number of entries.
+        self.entries = {}
+        self.use = {}                       # Key -> access count at last use.
+        self.accesses = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        "Return the cached value for the key, or None."
+        self.accesses += 1
+        value = self.entries.get(key)
+        if value == None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.use[key] = self.accesses
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.use[key] = self.accesses
+        if len(self.entries) > self.size:
+            self.evict(self.size * 3 / 4)
+
+    def setSize(self, size):
+        "Set the maximum number of entries."
+        self.size = size
+        self.evict(size)
+
+    def evict(self, size):
+        "Evict the least recently used entries, leaving at most size entries in the cache."
+        if len(self.entries) <= size:
+            return
+        keys = sorted(self.use, key=self.use.get)
+        for key in keys[:len(keys) - size]:
+            del self.entries[key]
+            del self.use[key]
+
+    def clear(self):
+        "Empty the cache and reset the statistics."
+        self.entries.clear()
+        self.use.clear()
+        self.accesses = 0
+        self.hits = 0
+        self.misses = 0
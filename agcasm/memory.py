@@ -19,6 +19,7 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 import sys
+from fractions import gcd
 from architecture import Architecture
 
 class MemoryType:
@@ -144,6 +145,33 @@ class MemoryMap:
                 self.banks[MemoryType.ERASABLE][self.memmap[startaddr].banknum] = self.memmap[startaddr]
             elif self.memmap[startaddr].memtype == MemoryType.FIXED:
                 self.banks[MemoryType.FIXED][self.memmap[startaddr].banknum] = self.memmap[startaddr]
+        self.lowest = 0
+        self.highest = -1
+        if len(self.addresses) > 0:
+            self.lowest = self.addresses[0]
+            self.highest = self.addresses[-1] + self.memmap[self.addresses[-1]].size - 1
+        self._buildBankTable()
+
+    def _buildBankTable(self):
+        """Build the bank lookup table. All bank boundaries are multiples of the block size, so every pseudo address in
+        a block belongs to the same bank. Each entry is a tuple of (bank descriptor, memory type, switched)."""
+        blocksize = 0
+        for startaddr in self.addresses:
+            blocksize = gcd(blocksize, startaddr)
+            blocksize = gcd(blocksize, self.memmap[startaddr].size)
+        self.blockShift = 0
+        if blocksize > 0:
+            self.blockShift = (blocksize & -blocksize).bit_length() - 1
+        self.bankTable = []
+        for block in range((self.highest >> self.blockShift) + 1):
+            pa = block << self.blockShift
+            entry = None
+            for startaddr in self.addresses:
+                bank = self.memmap[startaddr]
+                if pa < startaddr + bank.size:
+                    entry = (bank, bank.memtype, bank.isSwitched())
+                    break
+            self.bankTable.append(entry)
 
     def __str__(self):
         text = ""
@@ -154,23 +182,32 @@ class MemoryMap:
         return text
 
     def isValid(self, pa):
-        lowest = self.addresses[0]
-        highest = self.addresses[-1] + self.memmap[self.addresses[-1]].size - 1
-        if lowest <= pa <= highest:
+        if self.lowest <= pa <= self.highest:
             return True
         else:
             return False
 
+    def _lookup(self, pa):
+        "Return the bank table entry for the supplied pseudo address, or None if it is invalid."
+        if pa > self.highest:
+            return None
+        if pa < 0:
+            return self.bankTable[0]
+        return self.bankTable[pa >> self.blockShift]
+
     def _findBank(self, pa):
-        bank = None
-        found = False
-        for startaddr in self.addresses:
-            if pa < startaddr + self.memmap[startaddr].size:
-                found = True
-                break
-        if found:
-            bank = self.memmap[startaddr]
-        return bank
+        entry = self._lookup(pa)
+        if entry:
+            return entry[0]
+        return None
+
+    def classify(self, pa):
+        """Return a tuple of (bank descriptor, memory type, switched, offset in bank) for the supplied pseudo address.
+        The bank descriptor and memory type are None if the address is invalid."""
+        entry = self._lookup(pa)
+        if entry:
+            return (entry[0], entry[1], entry[2], pa - entry[0].startaddr)
+        return (None, None, False, None)
 
     def segmentedToPseudo(self, banktype, bank, offset=0, absolute=False):
         if absolute:
@@ -191,11 +228,12 @@ class MemoryMap:
     def pseudoToSegmented(self, pa):
         retval = (None, None)
         if pa != None:
-            bank = self._findBank(pa)
-            if bank:
-                if self.isSwitched(pa):
+            entry = self._lookup(pa)
+            if entry:
+                bank = entry[0]
+                if entry[2]:
                     offset = pa - bank.startaddr
-                    if self.isErasable(pa):
+                    if entry[1] == MemoryType.ERASABLE:
                         offset += 01400
                     else:
                         offset += 02000
@@ -208,15 +246,17 @@ class MemoryMap:
 
     def pseudoToAddress(self, pa):
         # Convert pseudo address to encoded form.
-        if self.isErasable(pa):
+        entry = self._lookup(pa)
+        switched = (entry != None and entry[2])
+        if entry != None and entry[1] == MemoryType.ERASABLE:
             # Set bits 11,10 to 00.
             retval = pa & 001777
-            if self.isSwitched(pa):
+            if switched:
                 # Set bits 9,8 to 11.
                 retval |= 001400
         else:
             retval = pa & 007777
-            if self.isSwitched(pa):
+            if switched:
                 # Set bits 11,10 to 01.
                 retval &= 073777
                 retval |= 002000
@@ -224,11 +264,16 @@ class MemoryMap:
 
     def pseudoToInterpretiveAddress(self, pa, size=14):
         # Convert pseudo address to interpretive encoded form.
-        (bank, offset) = self.pseudoToBankOffset(pa)
+        (bankdesc, memtype, switched, offset) = self.classify(pa)
+        bank = None
+        if bankdesc:
+            bank = bankdesc.banknum
+        else:
+            print >>sys.stderr, "Error, invalid pseudo address %06o" % pa
         if bank > 037:
             # Superbank 1
             bank -= 010
-        if self.isErasable(pa):
+        if memtype == MemoryType.ERASABLE:
             retval = 0400 * bank + offset
         else:
             retval = 02000 * bank + offset
@@ -281,17 +326,23 @@ class MemoryMap:
     def pseudoToSegmentedString(self, pa):
         text = ""
         if pa != None:
-            bankdesc = self._findBank(pa)
-            if bankdesc:
-                (bank, offset) = self.pseudoToSegmented(pa)
-                if bank == None or offset == None:
+            entry = self._lookup(pa)
+            if entry:
+                bankdesc = entry[0]
+                offset = pa
+                if entry[2]:
+                    offset = pa - bankdesc.startaddr
+                    if entry[1] == MemoryType.ERASABLE:
+                        offset += 01400
+                    else:
+                        offset += 02000
+                if bankdesc.banknum == None:
                     text = "?????? "
+                elif entry[1] == MemoryType.ERASABLE:
+                    bankstr = "E%1o" % bankdesc.banknum
+                    text = "%-2s,%04o" % (bankstr, offset)
                 else:
-                    if bankdesc.memtype == MemoryType.ERASABLE:
-                        bankstr = "E%1o" % bankdesc.banknum
-                        text = "%-2s,%04o" % (bankstr, offset)
-                    else:
-                        text = "%02o,%04o" % (bank, offset)
+                    text = "%02o,%04o" % (bankdesc.banknum, offset)
             else:
                 text = "??,????"
         else:
@@ -340,25 +391,16 @@ class MemoryMap:
         return size
 
     def isFixed(self, pa):
-        memtype = None
-        bank = self._findBank(pa)
-        if bank:
-            memtype = bank.memtype
-        return (memtype == MemoryType.FIXED)
+        entry = self._lookup(pa)
+        return (entry != None and entry[1] == MemoryType.FIXED)
 
     def isErasable(self, pa):
-        memtype = None
-        bank = self._findBank(pa)
-        if bank:
-            memtype = bank.memtype
-        return (memtype == MemoryType.ERASABLE)
+        entry = self._lookup(pa)
+        return (entry != None and entry[1] == MemoryType.ERASABLE)
 
     def isSwitched(self, pa):
-        banktype = None
-        bank = self._findBank(pa)
-        if bank:
-            banktype = bank.banktype
-        return (banktype == BankType.SWITCHED)
+        entry = self._lookup(pa)
+        return (entry != None and entry[2])
 
     def isUnswitched(self, pa):
         banktype = None
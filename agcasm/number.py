@@ -20,6 +20,7 @@
 
 import re
 import sys
+from lru import LRUCache
 
 class Number:
 
@@ -31,6 +32,10 @@ class Number:
     DECIMAL_RE = re.compile("^[+-]*[0-9]+[D]*[ ]*(E[+-]*[0-9]+)*[ ]*(B[+-]*[0-9]+)*[*]*$")
     FLOAT_RE   = re.compile("^[+-]*[0-9]*\.[0-9]+[ ]*(E[+-]*[0-9]+)* *(B[+-]*[0-9]+)*[*]*$")
 
+    # LRU cache of conversion results, keyed by (text, size, forcetype). Results are (valid, type, value) tuples,
+    # with double-precision values stored as tuples so that they cannot be modified through a cached entry.
+    cache = LRUCache()
+
     def __init__(self, text, forcetype=None, size=1, debug=False):
         self.valid = False
         self.text = text.strip()
@@ -42,6 +47,15 @@ class Number:
         else:
             self.value = ()
 
+        if not debug:
+            key = (text, size, forcetype)
+            result = Number.cache.get(key)
+            if result != None:
+                (self.valid, self.type, self.value) = result
+                if self.valid and self.size != 1:
+                    self.value = list(self.value)
+                return
+
         # Trim trailing asterisk, if any.
         if text.endswith('*'):
             text = text[:-1]
@@ -49,20 +63,142 @@ class Number:
         if debug:
             print "text: \"%s\"" % text
 
-        if forcetype != None:
-            if forcetype == Number.OCTAL:
-                self._getOctal(text, debug)
-            elif forcetype == Number.DECIMAL:
-                self._getDecimal(text, debug)
+        converted = self._scan(text, forcetype)
+        if converted == None:
+            if forcetype != None:
+                if forcetype == Number.OCTAL:
+                    converted = self._getOctal(text, debug)
+                elif forcetype == Number.DECIMAL:
+                    converted = self._getDecimal(text, debug)
+            else:
+                if self.OCTAL_RE.search(text):
+                    if debug:
+                        print "Octal format detected"
+                    converted = self._getOctal(text, debug)
+                elif self.DECIMAL_RE.search(text) or self.FLOAT_RE.search(text):
+                    if debug:
+                        print "Decimal format detected"
+                    converted = self._getDecimal(text, debug)
+
+        # Conversions which reported an error are not cached, so that the error is reported each time.
+        if not debug and converted != False:
+            value = self.value
+            if self.valid and self.size != 1:
+                value = tuple(value)
+            Number.cache.put(key, (self.valid, self.type, value))
+
+    @classmethod
+    def getCacheStats(cls):
+        "Return the number of cache hits and misses, and the number of cached literals."
+        return (Number.cache.hits, Number.cache.misses, len(Number.cache))
+
+    @classmethod
+    def setCacheSize(cls, size):
+        "Set the maximum number of cached literals."
+        Number.cache.setSize(size)
+
+    @classmethod
+    def clearCache(cls):
+        "Empty the cache and reset the statistics."
+        Number.cache.clear()
+
+    def _scan(self, text, forcetype):
+        """Classify and convert the common literal forms in a single pass: [+-]digits[D], [+-][digits].digits and
+        either followed by optional E and B scale factors. Return None if the text is not in one of these forms,
+        in which case the general conversion is used."""
+        n = len(text)
+        i = 0
+        negate = False
+        if n > 0 and (text[0] == '+' or text[0] == '-'):
+            negate = (text[0] == '-')
+            i = 1
+        start = i
+        octal = True
+        while i < n and '0' <= text[i] <= '9':
+            if text[i] > '7':
+                octal = False
+            i += 1
+
+        if forcetype == Number.OCTAL:
+            digits = text[start:]
+            if ' ' in digits:
+                digits = "".join(digits.split())
+            if digits == "" or digits.strip("01234567") != "":
+                return None
+            self.type = Number.OCTAL
+            return self._convertOctal(negate, int(digits, 8))
+        if forcetype != None and forcetype != Number.DECIMAL:
+            return None
+
+        if i == n and i > start and octal and forcetype == None:
+            self.type = Number.OCTAL
+            return self._convertOctal(negate, int(text[start:], 8))
+
+        if i < n and text[i] == '.':
+            i += 1
+            fraction = i
+            while i < n and '0' <= text[i] <= '9':
+                i += 1
+            if i == fraction:
+                return None
+            mantissa = text[start:i]
+            suffix = False
         else:
-            if self.OCTAL_RE.search(text):
-                if debug:
-                    print "Octal format detected"
-                self._getOctal(text, debug)
-            elif self.DECIMAL_RE.search(text) or self.FLOAT_RE.search(text):
-                if debug:
-                    print "Decimal format detected"
-                self._getDecimal(text, debug)
+            if i == start:
+                return None
+            mantissa = text[start:i]
+            suffix = (i < n and text[i] == 'D')
+            if suffix:
+                i += 1
+        end = i
+
+        epower = None
+        bpower = None
+        while i < n and text[i] == ' ':
+            i += 1
+        if i < n and text[i] == 'E':
+            (i, epower) = self._scanPower(text, i + 1)
+            if epower == None:
+                return None
+            while i < n and text[i] == ' ':
+                i += 1
+        if i < n and text[i] == 'B':
+            (i, bpower) = self._scanPower(text, i + 1)
+            if bpower == None:
+                return None
+        if i != n:
+            return None
+        if suffix and end != n and epower == None and bpower == None:
+            # Trailing spaces after a D suffix are not accepted by the general conversion.
+            return None
+
+        escale = 0
+        bscale = 0
+        if epower != None:
+            escale = pow(10.0, epower)
+        if bpower != None:
+            bscale = pow(2.0, bpower)
+
+        self.type = Number.DECIMAL
+        realval = float(mantissa)
+        if bscale != 0:
+            realval *= bscale
+        if escale != 0:
+            realval *= escale
+        return self._convertDecimal(negate, realval, text.replace('B', ' B').replace('E', ' E'))
+
+    def _scanPower(self, text, i):
+        "Scan a [+-]digits scale factor power starting at index i. Return the next index and the power, or None."
+        n = len(text)
+        start = i
+        if i < n and (text[i] == '+' or text[i] == '-'):
+            i += 1
+        digits = i
+        while i < n and '0' <= text[i] <= '9':
+            i += 1
+        if i == digits:
+            return (i, None)
+        return (i, int(text[start:i]))
 
     def scaleFactor(self, text):
         retval = 1.0
@@ -88,7 +224,9 @@ class Number:
         textfields = text.split()
         if len(textfields) > 1:
             text = "".join(textfields)
-        value = int(text, 8)
+        return self._convertOctal(negate, int(text, 8))
+
+    def _convertOctal(self, negate, value):
         if self.size == 1:
             self.value = value
             if negate:
@@ -102,6 +240,7 @@ class Number:
                 self.value[0] = ~self.value[0] & 077777
                 self.value[1] = ~self.value[1] & 077777
         self.valid = True
+        return True
 
     def _getDecimal(self, text, debug=False):
         negate = False
@@ -160,6 +299,10 @@ class Number:
             realval *= bscale
         if escale != 0:
             realval *= escale
+        return self._convertDecimal(negate, realval, text, debug)
+
+    def _convertDecimal(self, negate, realval, text, debug=False):
+        "Convert a scaled decimal value to AGC format. Return False, after reporting an error, if it is out of range."
         if debug:
             print "realval (scaled):", realval
         if realval >= 1.0:
@@ -171,7 +314,7 @@ class Number:
             else:
                 # Float greater than 1.0, error.
                 print >>sys.stderr, "Error, invalid number, greater than 1.0 (%s)" % (text)
-                return
+                return False
         else:
             value = 0
             rangeval = 14 * self.size
@@ -207,6 +350,7 @@ class Number:
         if debug:
             print "value:", value
         self.valid = True
+        return True
 
     def isValid(self):
         return self.valid
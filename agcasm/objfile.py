@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+# Copyright 2010 Jim Lawton <jim dot lawton at gmail dot com>
+#
+# This file is part of pyagc.
+#
+# This is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import os
+import cPickle as pickle
+from cache import ModuleCache
+
+class ObjectFileCache(ModuleCache):
+    """Module cache stored as one object file per module, next to the module source.
+
+    An object file holds the parser records of the module, the symbols it defines, the symbols it refers to and
+    the bank/LOC state it requires on entry and leaves on exit. AGC code is placed by SETLOC and BANK rather than
+    relocated, so the linker can only use an object file if the modules before it leave the assembler in the same
+    state as when it was assembled."""
+
+    MAGIC = "AGCOBJ"
+
+    def __init__(self, context, required=False):
+        ModuleCache.__init__(self, context, None)
+        self.required = required
+
+    def getFilename(self, modname):
+        "Return the object filename for a module."
+        return os.path.splitext(modname)[0] + ".obj"
+
+    def load(self):
+        pass
+
+    def save(self):
+        pass
+
+    def _read(self, modname):
+        filename = self.getFilename(modname)
+        if not os.path.isfile(filename):
+            return None
+        try:
+            f = open(filename, 'rb')
+            try:
+                (magic, version, fingerprint, name, data) = pickle.load(f)
+            finally:
+                f.close()
+        except Exception:
+            self.context.log(3, "objfile: unable to read %s, ignoring", filename)
+            return None
+        if magic != self.MAGIC or version != self.VERSION or name != modname:
+            return None
+        if fingerprint != self.fingerprint:
+            self.reason = "assembled by a different assembler version or with different options"
+            return None
+        return data
+
+    def _write(self, modname, data):
+        if self.required:
+            # Linking only, never rewrite object files.
+            return
+        f = open(self.getFilename(modname), 'wb')
+        pickle.dump((self.MAGIC, self.VERSION, self.fingerprint, modname, data), f, pickle.HIGHEST_PROTOCOL)
+        f.close()
@@ -48,3 +48,6 @@ class Opcode(object):
         self.addressType = addressType              # Operand address type, if applicable.
         self.numwords = numwords                    # Number of code words generated.
         self.type = None                            # Parser record type for this opcode.
+        self.handler = None                         # Bound parser method, if any.
+        if methodName != None:
+            self.handler = getattr(self, "parse_" + methodName, None)
@@ -467,3 +467,17 @@ OPCODES = {
         }
     }
 }
+
+def buildDispatchTable(opcodes):
+    """Build a table mapping (mode, mnemonic) to (handler, opcode type), where handler is the bound parse method.
+       Interpretive opcodes take precedence over directives, which take precedence over instructions of the mode."""
+    table = {}
+    for mode in (OpcodeType.BASIC, OpcodeType.EXTENDED):
+        for optype in (mode, OpcodeType.DIRECTIVE, OpcodeType.INTERPRETIVE):
+            for (mnemonic, opobj) in opcodes.get(optype, {}).items():
+                table[(mode, mnemonic)] = (opobj.parse, optype)
+    return table
+
+DISPATCH = {}
+for arch in OPCODES:
+    DISPATCH[arch] = buildDispatchTable(OPCODES[arch])
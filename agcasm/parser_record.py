@@ -23,9 +23,17 @@ from memory import MemoryType
 from interpretive import InterpretiveType
 import sys
 
-class ParserRecord:
+# NOTE: Must be a new-style class, for __slots__.
+class ParserRecord(object):
     """Class storing parser data."""
 
+    # A record is created for every source line, so use slots rather than a per-instance dictionary.
+    __slots__ = ("context", "srcfile", "linenum", "srcline", "type", "operandType", "label", "pseudolabel", "opcode",
+                 "operands", "comment", "address", "code", "complete", "target", "mode", "super", "ebank", "fbank",
+                 "loc", "lastEbank", "previousWasEbankEquals", "previousWasSbankEquals", "previousWasIndex",
+                 "global_linenum", "argcode", "interpArgs", "interpArgCount", "interpArgType", "interpArgIncrement",
+                 "packingType", "complementNext", "errorMsg", "warningMsg", "state", "exitState", "blockers")
+
     def __init__(self, context, srcfile, linenum, srcline, type, label, pseudolabel, opcode, operands, comment, address, code):
         self.context = context              # Assembler context.
         self.srcfile = srcfile              # Source filename.
@@ -40,7 +48,6 @@ class ParserRecord:
         self.comment = comment              # Comments.
         self.address = address              # Address of the first word in the code section.
         self.code = code                    # List of generated code words.
-        self.numwords = 0                   # Number of code words generated.
         self.complete = False               # Assembly complete? i.e. all symbols resolved.
         self.target = None                  # Target address, if any, e.g. for = directive.
         self.mode = context.mode            # Mode.
@@ -62,6 +69,9 @@ class ParserRecord:
         self.complementNext = False
         self.errorMsg = None
         self.warningMsg = None
+        self.state = None                   # Assembler state before parsing, if incomplete after pass 1.
+        self.exitState = None               # Assembler state after parsing, if incomplete after pass 1.
+        self.blockers = None                # Undefined symbols that prevented the record from being completed.
 
     def isGenerative(self):
         return RecordType.isGenerative(self.type)
@@ -102,68 +112,120 @@ class ParserRecord:
         self.warningMsg = msg
 
     def __str__(self):
-        text = ""
-        if self.errorMsg != None or self.warningMsg != None:
-            text += '\n'
-            if self.errorMsg != None:
-                text += "%s\n" % self.errorMsg
-            if self.warningMsg != None:
-                text += "%s\n" % self.warningMsg
-        if self.type == RecordType.INCLUDE:
-            text += "\n\n"
-        text += "%06d,%06d " % (self.global_linenum, self.linenum)
-        if RecordType.isIgnored(self.type):
-            if self.context.debug:
-                text += 69 * ' '
-            else:
-                text += 29 * ' '
+        return RecordFormatter.forContext(self.context).format(self)
+
+# NOTE: Must be a new-style class.
+class RecordFormatter(object):
+    """Formats parser records as listing lines.
+
+    Column templates are built once per formatter, and address strings and record type information are cached,
+    so a single formatter can be used for a whole listing."""
+
+    def __init__(self, context):
+        self.context = context
+        debug = context.debug
+        self.ignored = (debug and 69 or 29) * ' '
+        self.nongenerative = (debug and 53 or 13) * ' '
+        self.noAddress = 8 * ' '
+        self.noCode = " ????? " + 6 * ' '
+        self.addresses = {}                 # Pseudo address -> segmented address string, with trailing space.
+        self.types = {}                     # Record type -> (ignored, address valid, generative, type string).
+        self.banks = None                   # Bank columns of the debug listing.
+        self.update()
+
+    @classmethod
+    def forContext(cls, context):
+        "Return the formatter shared by all records of an assembly, with its bank columns updated."
+        formatter = context.formatter
+        if formatter == None:
+            formatter = RecordFormatter(context)
+            context.formatter = formatter
+        else:
+            formatter.update()
+        return formatter
+
+    def update(self):
+        "Update the bank columns from the current context."
+        if self.context.debug:
+            memmap = self.context.memmap
+            self.banks = memmap.bankToString(MemoryType.ERASABLE, self.context.ebank) + ' ' + memmap.bankToString(MemoryType.FIXED, self.context.fbank) + ' '
+
+    def getAddress(self, pa):
+        "Return the segmented address string for a pseudo address, with a trailing space."
+        text = self.addresses.get(pa)
+        if text == None:
+            text = self.context.memmap.pseudoToSegmentedString(pa) + ' '
+            self.addresses[pa] = text
+        return text
+
+    def getType(self, rectype):
+        info = self.types.get(rectype)
+        if info == None:
+            info = (RecordType.isIgnored(rectype), RecordType.isAddressValid(rectype),
+                    RecordType.isGenerative(rectype), RecordType.toString(rectype) + ' ')
+            self.types[rectype] = info
+        return info
+
+    def format(self, record, buffer=None):
+        """Format a record as it appears in the listing, without the final newline. If a buffer list is supplied,
+        the text is appended to it in pieces, otherwise it is returned as a string."""
+        if buffer == None:
+            text = []
+            self.format(record, text)
+            return "".join(text)
+        (isIgnored, isAddressValid, isGenerative, typeString) = self.getType(record.type)
+        messages = record.errorMsg != None or record.warningMsg != None
+        if messages:
+            text = '\n'
+            if record.errorMsg != None:
+                text += record.errorMsg + '\n'
+            if record.warningMsg != None:
+                text += record.warningMsg + '\n'
+            buffer.append(text)
+        if record.type == RecordType.INCLUDE:
+            buffer.append("\n\n")
+        buffer.append("%06d,%06d " % (record.global_linenum, record.linenum))
+        if isIgnored:
+            buffer.append(self.ignored)
         else:
-            if RecordType.isAddressValid(self.type):
-                text += self.context.memmap.pseudoToSegmentedString(self.address) + ' '
+            if isAddressValid:
+                buffer.append(self.getAddress(record.address))
             else:
-                text += 8 * ' '
-            if self.target:
-                if self.target >= 0:
-                    text += self.context.memmap.pseudoToSegmentedString(self.target) + ' '
+                buffer.append(self.noAddress)
+            target = record.target
+            if target:
+                if target >= 0:
+                    buffer.append(self.getAddress(target))
                 else:
-                    text += "  %05o " % self.target
+                    buffer.append("  %05o " % target)
             else:
-                text += 8 * ' '
-            if self.isGenerative():
+                buffer.append(self.noAddress)
+            if isGenerative:
                 if self.context.debug:
-                    text += RecordType.toString(self.type) + ' '
-                    text += RecordType.toString(self.operandType) + ' '
-                    text += self.context.memmap.bankToString(MemoryType.ERASABLE, self.context.ebank)
-                    text += ' '
-                    text += self.context.memmap.bankToString(MemoryType.FIXED, self.context.fbank)
-                    text += ' '
-                    text += '[S%d]' % (self.super)
-                    text += ' '
-                    text += "(%02d,%02d) " % (self.interpArgs, self.interpArgCount)
-                    if self.argcode != None and self.argcode > 0:
-                        text += "%05o " % (self.argcode)
+                    if record.argcode != None and record.argcode > 0:
+                        argcode = "%05o " % (record.argcode)
                     else:
-                        text += 6 * ' '
-                    if self.interpArgIncrement == True:
-                        text += "+ "
+                        argcode = 6 * ' '
+                    if record.interpArgIncrement == True:
+                        increment = "+ "
                     else:
-                        text += 2 * ' '
-                    text += InterpretiveType.toString(self.interpArgType) + ' '
-                if self.code != None and len(self.code) > 0:
-                    if len(self.code) == 1 and self.code[0] != None:
-                        text += " %05o %s " % (self.code[0] & 077777, 5 * ' ')
-                    elif len(self.code) == 2 and self.code[0] != None and self.code[1] != None:
-                        text += " %05o %05o " % (self.code[0] & 077777, self.code[1] & 077777)
+                        increment = 2 * ' '
+                    buffer.append("%s%s %s[S%d] (%02d,%02d) %s%s%s " % (typeString, RecordType.toString(record.operandType),
+                                  self.banks, record.super, record.interpArgs, record.interpArgCount, argcode, increment,
+                                  InterpretiveType.toString(record.interpArgType)))
+                code = record.code
+                if code != None and len(code) > 0:
+                    if len(code) == 1 and code[0] != None:
+                        buffer.append(" %05o       " % (code[0] & 077777))
+                    elif len(code) == 2 and code[0] != None and code[1] != None:
+                        buffer.append(" %05o %05o " % (code[0] & 077777, code[1] & 077777))
                     else:
-                        text += " ????? " + 6 * ' '
+                        buffer.append(self.noCode)
                 else:
-                    text += " ????? " + 6 * ' '
+                    buffer.append(self.noCode)
             else:
-                if self.context.debug:
-                    text += 53 * ' '
-                else:
-                    text += 13 * ' '
-        text += "   %s" % self.srcline
-        if self.errorMsg != None or self.warningMsg != None:
-            text += '\n'
-        return text
+                buffer.append(self.nongenerative)
+        buffer.append("   ")
+        buffer.append(record.srcline)
+        if messages:
+            buffer.append('\n')
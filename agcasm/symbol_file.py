@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+
+# Copyright 2010 Jim Lawton <jim dot lawton at gmail dot com>
+#
+# This file is part of pyagc.
+#
+# This is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+# Binary symbol table file (.symtab). This module has no dependencies on the rest of the assembler, so that it
+# can be used by other tools.
+#
+# All fields are big-endian. The file consists of:
+#
+#   Header:  magic "AGCSYM", version (H), number of symbols (I), offset of the entries (I), offset of the
+#            string table (I), offset of the address index (I), number of address index entries (I).
+#   Entries: one per symbol, sorted by name: name offset (I), pseudo address (i), length (i), record type (h),
+#            source file name offset (I), source line (I). Offsets are relative to the start of the string
+#            table. An undefined address or record type is stored as -1. The length is negative for a label on a
+#            SETLOC or BANK which moves the location counter backward.
+#   Address index: the entry index (I) of each defined symbol, sorted by pseudo address and then by name.
+#   Strings: NUL-terminated symbol names, in sorted order, followed by the source file names.
+
+import os
+import sys
+import mmap
+import struct
+import bisect
+
+def findNearest(addresses, lengths, address):
+    """Return the index of the symbol nearest to, and not above, the supplied address in sequences of symbol
+    addresses and lengths sorted by address and then by name, or -1 if there is none. Of the symbols at the
+    nearest address, the first one which covers the address is preferred, otherwise the first one."""
+    index = bisect.bisect_right(addresses, address) - 1
+    if index < 0:
+        return -1
+    base = addresses[index]
+    nearest = -1
+    while index >= 0 and addresses[index] == base:
+        if address < base + lengths[index]:
+            nearest = index
+        index -= 1
+    if nearest < 0:
+        nearest = index + 1
+    return nearest
+
+class SymbolFileEntry:
+    """Class storing a symbol read from a binary symbol table file."""
+
+    def __init__(self, name, value, length, type, file, line):
+        self.name = name            # Symbol name.
+        self.value = value          # Pseudo address, or None if undefined.
+        self.length = length        # Length of the addressed quantity in words.
+        self.type = type            # Record type, or None.
+        self.file = file            # Source file name.
+        self.line = line            # Source line number.
+
+    def __str__(self):
+        if self.value == None:
+            value = "******"
+        else:
+            value = "%06o" % self.value
+        return "%-8s %s %3d %s:%d" % (self.name, value, self.length, self.file, self.line)
+
+class SymbolFile:
+    """Read-only binary symbol table, memory-mapped, with binary search lookup by name."""
+
+    MAGIC   = "AGCSYM"
+    VERSION = 3
+    HEADER  = struct.Struct(">6sHIIIII")
+    ENTRY   = struct.Struct(">IiihII")
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open(filename, 'rb')
+        self.map = None
+        # An empty file cannot be mapped, e.g. one left by a failed build.
+        if os.fstat(self.file.fileno()).st_size < self.HEADER.size:
+            self.close()
+            raise ValueError("%s: not a symbol table file" % filename)
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.count, self.entries, self.strings, self.index, self.indexCount) = self.HEADER.unpack_from(self.map, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            self.close()
+            raise ValueError("%s: not a symbol table file, or unsupported version" % filename)
+        self.addresses = _IndexedField(self, 4, ">i")
+        self.lengths = _IndexedField(self, 8, ">i")
+
+    def close(self):
+        if self.map != None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    def __len__(self):
+        return self.count
+
+    def _getString(self, offset):
+        "Return the NUL-terminated string at the supplied string table offset."
+        start = self.strings + offset
+        return self.map[start:self.map.find('\0', start)]
+
+    def getName(self, index):
+        "Return the name of the symbol at the supplied index."
+        (nameOffset,) = struct.unpack_from(">I", self.map, self.entries + index * self.ENTRY.size)
+        return self._getString(nameOffset)
+
+    def getEntry(self, index):
+        "Return the symbol at the supplied index, as a SymbolFileEntry."
+        (nameOffset, value, length, type, fileOffset, line) = self.ENTRY.unpack_from(self.map, self.entries + index * self.ENTRY.size)
+        if value < 0:
+            value = None
+        if type < 0:
+            type = None
+        return SymbolFileEntry(self._getString(nameOffset), value, length, type, self._getString(fileOffset), line)
+
+    def find(self, name):
+        "Return the index of the named symbol, or -1 if it is not in the table."
+        low = 0
+        high = self.count
+        while low < high:
+            middle = (low + high) / 2
+            if self.getName(middle) < name:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self.getName(low) == name:
+            return low
+        return -1
+
+    def lookup(self, name):
+        "Return the named symbol as a SymbolFileEntry, or None."
+        index = self.find(name)
+        if index < 0:
+            return None
+        return self.getEntry(index)
+
+    def findAddress(self, address):
+        """Return (entry, offset) for the symbol nearest to, and not above, the supplied pseudo address, where
+        entry is a SymbolFileEntry, or None if there is no such symbol."""
+        nearest = findNearest(self.addresses, self.lengths, address)
+        if nearest < 0:
+            return None
+        entry = self.getEntry(self.addresses.getEntryIndex(nearest))
+        return (entry, address - entry.value)
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self.getEntry(index)
+
+    @classmethod
+    def write(cls, outfile, symbols):
+        """Write a binary symbol table. symbols is a list of (name, value, length, type, file, line) tuples,
+        sorted by name."""
+        strings = []
+        offset = 0
+        nameOffsets = []
+        for symbol in symbols:
+            nameOffsets.append(offset)
+            strings.append(symbol[0])
+            offset += len(symbol[0]) + 1
+        fileOffsets = {}
+        for symbol in symbols:
+            filename = symbol[4] or ""
+            if filename not in fileOffsets:
+                fileOffsets[filename] = offset
+                strings.append(filename)
+                offset += len(filename) + 1
+
+        entries = []
+        for (nameOffset, (name, value, length, type, filename, line)) in zip(nameOffsets, symbols):
+            if value == None:
+                value = -1
+            if type == None:
+                type = -1
+            entries.append(cls.ENTRY.pack(nameOffset, value, length, type, fileOffsets[filename or ""], line or 0))
+
+        defined = [ (symbol[1], index) for (index, symbol) in enumerate(symbols) if symbol[1] != None ]
+        defined.sort()
+        addressIndex = struct.pack(">%dI" % len(defined), *[ index for (value, index) in defined ])
+
+        entryOffset = cls.HEADER.size
+        indexOffset = entryOffset + len(symbols) * cls.ENTRY.size
+        stringOffset = indexOffset + len(addressIndex)
+        outfile.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, len(symbols), entryOffset, stringOffset, indexOffset, len(defined)))
+        outfile.write("".join(entries))
+        outfile.write(addressIndex)
+        outfile.write("\0".join(strings))
+        if strings:
+            outfile.write("\0")
+
+class _IndexedField:
+    """Sequence view of one field of the symbol table entries, in address index order, for use with bisect."""
+
+    def __init__(self, symfile, offset, format):
+        self.symfile = symfile
+        self.offset = offset
+        self.format = format
+
+    def __len__(self):
+        return self.symfile.indexCount
+
+    def getEntryIndex(self, position):
+        "Return the entry index at the supplied position in the address index."
+        return struct.unpack_from(">I", self.symfile.map, self.symfile.index + position * 4)[0]
+
+    def __getitem__(self, position):
+        if position < 0 or position >= self.symfile.indexCount:
+            raise IndexError(position)
+        symfile = self.symfile
+        entry = symfile.entries + self.getEntryIndex(position) * symfile.ENTRY.size
+        return struct.unpack_from(self.format, symfile.map, entry + self.offset)[0]
+
+if __name__=="__main__":
+    from optparse import OptionParser
+
+    parser = OptionParser("usage: %prog [options] symtab_file [symbol...]")
+    parser.add_option("-a", "--address", action="store_true", dest="address", default=False, help="Look up octal pseudo addresses instead of symbols.")
+    (options, args) = parser.parse_args()
+    if len(args) < 1:
+        parser.error("A symbol table file must be supplied!")
+        sys.exit(1)
+
+    symfile = SymbolFile(args[0])
+    if options.address:
+        for address in args[1:]:
+            result = symfile.findAddress(int(address, 8))
+            if result == None:
+                print "%-8s no symbol" % address
+            else:
+                (entry, offset) = result
+                print "%-8s %s+%o" % (address, entry.name, offset)
+    elif len(args) > 1:
+        for name in args[1:]:
+            entry = symfile.lookup(name)
+            if entry == None:
+                print "%-8s not found" % name
+            else:
+                print entry
+    else:
+        for entry in symfile:
+            print entry
+    symfile.close()
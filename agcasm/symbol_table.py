@@ -20,6 +20,10 @@
 
 import sys
 import struct
+import bisect
+from collections import deque, OrderedDict
+from expression import Expression
+from symbol_file import SymbolFile, findNearest
 
 class SymbolTableEntry:
 
@@ -30,6 +34,7 @@ class SymbolTableEntry:
         self.value = value                  # Actual value.
         self.recordIndex = None             # Index of the parser record containing the definition of this symbol.
         self.references = []                # TODO: List of references.
+        self.dependencies = []              # Symbols referenced by the symbolic value, if undefined when added.
         self.length = length                # Length of the addressed quantity (default is 1 word).
         self.type = type                    # Type of record the symbol refers to.
         self.file = file
@@ -65,56 +70,105 @@ class SymbolTableEntry:
         return text
 
 class SymbolTable:
+    """Symbol table, hashed by name. The undefined symbols are kept in an insertion-ordered set which shrinks as
+    symbols are defined, and a sorted index of the names is maintained incrementally for listings and range
+    queries."""
+
     def __init__(self, context):
         self.symbols = {}
-        self.undefs = []
+        self.undefs = OrderedDict()     # Undefined symbols, in the order they were added. Values are unused.
         self.context = context
+        self.lookups = None             # Symbols looked up -> (defined, value), when recording for the module cache.
+        self.sortedNames = []           # Sorted symbol names, excluding those added since the index was last used.
+        self.newNames = []              # Symbol names added since the sorted index was last used.
+        self.addressIndex = None        # (addresses, lengths, names) of the defined symbols, sorted by address.
+
+    def __contains__(self, name):
+        return name in self.symbols
 
     def add(self, name=None, symbolic=None, value=None, length=1, type=None):
         if name != None:
-            if name in self.symbols.keys():
+            if name in self.symbols:
                 self.context.error("symbol \"%s\" already defined!" % (name))
             else:
-                self.symbols[name] = SymbolTableEntry(self.context, name, symbolic, value, length, type, self.context.srcfile, self.context.linenum)
-                self.symbols[name].recordIndex = self.context.global_linenum - 1
+                entry = SymbolTableEntry(self.context, name, symbolic, value, length, type, self.context.srcfile, self.context.linenum)
+                entry.recordIndex = self.context.global_linenum - 1
+                self.symbols[name] = entry
+                self.newNames.append(name)
+                self.addressIndex = None
                 if value == None:
-                    self.undefs.append(name)
-                    self.context.log(6, "[%05d] added undefined symbol %-8s at index %d" % (len(self.symbols), name, self.symbols[name].recordIndex))
-                else:
-                    self.context.log(6, "[%05d] added   defined symbol %-8s %s at index %d" % (len(self.symbols), name, self.context.memmap.pseudoToSegmentedString(value), self.symbols[name].recordIndex))
+                    entry.dependencies = self._getDependencies(symbolic)
+                    self.undefs[name] = None
+                    self.context.log(6, "[%05d] added undefined symbol %-8s at index %d", len(self.symbols), name, entry.recordIndex)
+                elif self.context.logEnabled[6]:
+                    self.context.log(6, "[%05d] added   defined symbol %-8s %s at index %d", len(self.symbols), name, self.context.memmap.pseudoToSegmentedString(value), entry.recordIndex)
+
+    def addEntry(self, entry):
+        "Add an existing symbol table entry, e.g. one restored from the module cache."
+        if entry.name not in self.symbols:
+            self.newNames.append(entry.name)
+        self.symbols[entry.name] = entry
+        self.addressIndex = None
+        if entry.value == None:
+            self.undefs[entry.name] = None
 
     def update(self, name=None, symbolic=None, value=None, length=1, type=None):
         if name != None:
-            if name not in self.symbols.keys():
+            entry = self.symbols.get(name)
+            if entry == None:
                 self.context.error("symbol \"%s\" not defined!" % (name))
             else:
-                entry = self.symbols[name]
                 oldval = entry.value
+                if value != oldval or length != entry.length:
+                    self.addressIndex = None
                 entry.value = value
                 entry.length = length
                 entry.type = type
-                self.symbols[name] = entry
-                self.context.log(6, "updated symbol %-8s %s -> %s" % (name, self.context.memmap.pseudoToSegmentedString(oldval), self.context.memmap.pseudoToSegmentedString(value)))
-
-    def resolve(self, maxPasses=10):
-        nPrevUndefs = nUndefs = len(self.undefs)
-        for i in range(maxPasses):
-            self.context.log(3, "symbol pass %d: %d undefined symbols" % (i, nUndefs))
-            if nUndefs == 0:
-                self.context.log(3, "all symbols resolved")
-                break
-            for symbol in self.undefs:
-                self.context.log(3, "attempting to resolve symbol \"%s\" (%d)" % (symbol, self.symbols[symbol].recordIndex))
-                if not self.symbols[symbol].isComplete():
-                    self.context.assembler.parseRecord(self.symbols[symbol].recordIndex)
-                    if self.symbols[symbol].isComplete():
-                        self.context.records[self.symbols[symbol].recordIndex].complete = True
-            self.pruneUndefines()
-            nUndefs = len(self.undefs)
-            if nUndefs == nPrevUndefs:
-                self.context.error("no progress resolving symbols, %d undefined symbols" % nUndefs, source=False, count=False)
-                break
-            nPrevUndefs = nUndefs
+                if value != None:
+                    self.undefs.pop(name, None)
+                elif name not in self.undefs:
+                    self.undefs[name] = None
+                if self.context.logEnabled[6]:
+                    self.context.log(6, "updated symbol %-8s %s -> %s", name, self.context.memmap.pseudoToSegmentedString(oldval), self.context.memmap.pseudoToSegmentedString(value))
+
+    def _getDependencies(self, symbolic):
+        "Return the names of the symbols referenced by the supplied operand expression."
+        return list(Expression.compile(symbolic, True).symbols)
+
+    def resolve(self):
+        """Resolve undefined symbols in dependency order. Each undefined symbol is re-evaluated once, when all of the
+        symbols its definition refers to have been defined."""
+        self.context.log(3, "resolving %d undefined symbols", len(self.undefs))
+        waiting = {}            # Number of incomplete dependencies of each undefined symbol.
+        dependents = {}         # Undefined symbols waiting on each incomplete symbol.
+        worklist = deque()
+        for symbol in self.undefs:
+            count = 0
+            for dep in self.symbols[symbol].dependencies:
+                if dep not in self.symbols or not self.symbols[dep].isComplete():
+                    dependents.setdefault(dep, []).append(symbol)
+                    count += 1
+            waiting[symbol] = count
+            if count == 0:
+                worklist.append(symbol)
+        while worklist:
+            symbol = worklist.popleft()
+            entry = self.symbols[symbol]
+            self.context.log(8, "attempting to resolve symbol \"%s\" (%d)", symbol, entry.recordIndex)
+            self.context.assembler.parseRecord(entry.recordIndex)
+            if entry.isComplete():
+                self.context.records[entry.recordIndex].complete = True
+                for dependent in dependents.get(symbol, []):
+                    waiting[dependent] -= 1
+                    if waiting[dependent] == 0:
+                        worklist.append(dependent)
+        self.pruneUndefines()
+        nUndefs = len(self.undefs)
+        if nUndefs == 0:
+            self.context.log(3, "all symbols resolved")
+        else:
+            self._reportUnresolved(waiting)
+            self.context.error("unable to resolve symbols, %d undefined symbols" % nUndefs, source=False, count=False)
         if self.context.debug and nUndefs == 0:
             for symbol in self.symbols:
                 entry = self.symbols[symbol]
@@ -122,42 +176,107 @@ class SymbolTable:
                     entry.type = self.context.records[entry.recordIndex].type
                     self.symbols[symbol] = entry
 
-    def pruneUndefines(self):
-        # Prune the undefs list.
-        numUndefs = len(self.undefs)
-        self.context.log(3, "pruning undefined symbols list (%d undefs)" % numUndefs)
-        tmpUndefs = []
+    def _reportUnresolved(self, waiting):
+        "Report the reason each remaining undefined symbol could not be resolved."
         for symbol in self.undefs:
             entry = self.symbols[symbol]
-            if not entry.isComplete():
-                tmpUndefs.append(symbol)
-            else:
-                self.context.log(6, "removing %s from undefined symbols list" % (symbol))
-        self.undefs = tmpUndefs
-        self.context.log(3, "removed %d symbols from undef list" % (numUndefs - len(self.undefs)))
-        #self.printUndefs()
+            if waiting[symbol] == 0:
+                self.context.error("unable to evaluate symbol \"%s\" (%s:%d)" % (symbol, entry.file, entry.line), source=False, count=False)
+            for dep in entry.dependencies:
+                if dep not in self.symbols:
+                    self.context.error("symbol \"%s\" (%s:%d) refers to undefined symbol \"%s\"" % (symbol, entry.file, entry.line, dep), source=False, count=False)
+
+        # Find circular definitions, i.e. cycles in the dependency graph of the remaining undefined symbols.
+        state = {}              # 1 = on the current path, 2 = finished.
+        for start in self.undefs:
+            if start in state:
+                continue
+            path = [ start ]
+            state[start] = 1
+            stack = [ iter(self.symbols[start].dependencies) ]
+            while stack:
+                dep = next(stack[-1], None)
+                if dep == None:
+                    state[path.pop()] = 2
+                    stack.pop()
+                elif dep in self.undefs:
+                    if dep not in state:
+                        path.append(dep)
+                        state[dep] = 1
+                        stack.append(iter(self.symbols[dep].dependencies))
+                    elif state[dep] == 1:
+                        cycle = path[path.index(dep):] + [ dep ]
+                        self.context.error("circular symbol definition: %s" % (" -> ".join(cycle)), source=False, count=False)
+
+    def pruneUndefines(self):
+        "Check the undefined symbols set. Symbols are removed from it as they are defined, by update()."
+        self.context.log(3, "%d undefined symbols remaining", len(self.undefs))
 
     def keys(self):
         return self.symbols.keys()
 
     def getNumSymbols(self):
-        return len(self.symbols.keys())
+        return len(self.symbols)
+
+    def getSortedNames(self):
+        "Return the sorted list of symbol names. The list must not be modified."
+        if self.newNames:
+            self.newNames.sort()
+            # Sorting the concatenation of two sorted runs is a linear merge.
+            self.sortedNames.extend(self.newNames)
+            self.sortedNames.sort()
+            self.newNames = []
+        return self.sortedNames
+
+    def getRange(self, first=None, last=None):
+        "Return the sorted names of the symbols between first and last inclusive. Either bound may be None."
+        names = self.getSortedNames()
+        start = 0
+        end = len(names)
+        if first != None:
+            start = bisect.bisect_left(names, first)
+        if last != None:
+            end = bisect.bisect_right(names, last)
+        return names[start:end]
 
     def lookup(self, name):
         entry = None
         if name in self.symbols:
             entry = self.symbols[name]
+        if self.lookups != None and name not in self.lookups:
+            if entry != None:
+                self.lookups[name] = (True, entry.value)
+            else:
+                self.lookups[name] = (False, None)
         return entry
 
+    def getAddressIndex(self):
+        """Return the reverse index of the defined symbols, as (addresses, lengths, names) lists sorted by pseudo
+        address and then by name. The lists must not be modified."""
+        if self.addressIndex == None:
+            index = [ (entry.value, name, entry.length) for (name, entry) in self.symbols.iteritems() if entry.value != None ]
+            index.sort()
+            self.addressIndex = ([ value for (value, name, length) in index ],
+                                 [ length for (value, name, length) in index ],
+                                 [ name for (value, name, length) in index ])
+        return self.addressIndex
+
+    def lookupAddress(self, pa):
+        """Return (entry, offset) for the symbol nearest to, and not above, the supplied pseudo address, preferring
+        a symbol which covers the address, or None if there is no such symbol."""
+        (addresses, lengths, names) = self.getAddressIndex()
+        nearest = findNearest(addresses, lengths, pa)
+        if nearest < 0:
+            return None
+        return (self.symbols[names[nearest]], pa - addresses[nearest])
+
     def printTable(self, outfile=None):
         if outfile == None:
             out = sys.stdout
         else:
             out = outfile
-        symbols = self.symbols.keys()
-        symbols.sort()
         print >>out, "\nDefined symbols:\n"
-        for symbol in symbols:
+        for symbol in self.getSortedNames():
             print >>out, self.symbols[symbol]
 
         if len(self.undefs) > 0:
@@ -178,6 +297,10 @@ class SymbolTable:
         return len(self.undefs)
 
     def write(self, outfile=None):
+        "Write the binary symbol table, see symbol_file.py for the format."
         if outfile != None:
-            pass
-            # TODO: Write binary symtab output.
+            symbols = []
+            for name in self.getSortedNames():
+                entry = self.symbols[name]
+                symbols.append((name, entry.value, entry.length, entry.type, entry.file, entry.line))
+            SymbolFile.write(outfile, symbols)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+# Copyright 2010 Jim Lawton <jim dot lawton at gmail dot com>
+#
+# This file is part of pyagc.
+#
+# This is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agcasm"))
+
+import api
+from binary import ObjectCode
+
+SOURCE = """                SETLOC  4000
+START           TC      START
+                CA      START
+                BANK    20
+B20             CA      START
+                TC      B20
+                TC      START
+                BANK    21
+B21             CA      B20
+                TC      B21
+"""
+
+class ObjectCodeTest(unittest.TestCase):
+
+    def getBuggers(self, rope):
+        return dict([ (bank, rope.getWord(bank, index)) for (bank, index) in rope.buggerIndex.items() ])
+
+    def testIncrementalBuggers(self):
+        result = api.assemble({ "MAIN.agc": SOURCE })
+        self.assertEqual(result.errors, 0)
+        rope = result.rope
+        before = self.getBuggers(rope)
+
+        # Change the first word of bank 20, in both the rope and the records it was built from.
+        record = [ record for record in result.records if record.label == "B20" ][0]
+        (bank, offset) = result.context.memmap.pseudoToBankOffset(record.address)
+        self.assertEqual(bank, 020)
+        record.code[0] = 030001
+        rope.setWord(bank, offset, 030001)
+        rope.generateBuggers()
+
+        after = self.getBuggers(rope)
+        changed = [ bank for bank in before if before[bank] != after[bank] ]
+        self.assertEqual(changed, [ 020 ])
+
+        fresh = ObjectCode(result.context)
+        fresh.generateBuggers()
+        self.assertEqual(fresh.getBytes(), rope.getBytes())
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+# Copyright 2010 Jim Lawton <jim dot lawton at gmail dot com>
+#
+# This file is part of pyagc.
+#
+# This is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agcasm"))
+
+import api
+from symbol_file import SymbolFile
+
+class SymbolFileTest(unittest.TestCase):
+
+    def assembleAndLoad(self, source):
+        result = api.assemble({ "MAIN.agc": source })
+        self.assertEqual(result.errors, 0)
+        (fd, filename) = tempfile.mkstemp(suffix=".symtab")
+        try:
+            f = os.fdopen(fd, 'wb')
+            result.symtab.write(f)
+            f.close()
+            symfile = SymbolFile(filename)
+            entries = dict([ (entry.name, entry) for entry in symfile ])
+            symfile.close()
+        finally:
+            os.remove(filename)
+        return (result, entries)
+
+    def testBackwardSetloc(self):
+        # A label on a SETLOC which moves the location counter backward has a negative length.
+        (result, entries) = self.assembleAndLoad("""                SETLOC  4000
+START           TC      START
+                BANK    20
+B20             CA      START
+BACK            SETLOC  4001
+                CA      START
+""")
+        length = result.symtab.symbols["BACK"].length
+        self.assertTrue(length < 0)
+        self.assertEqual(entries["BACK"].length, length)
+        self.assertEqual(entries["B20"].value, result.symtab.symbols["B20"].value)
+
+    def testEmptyFile(self):
+        # A failed build leaves an empty symbol table file.
+        (fd, filename) = tempfile.mkstemp(suffix=".symtab")
+        os.close(fd)
+        try:
+            self.assertRaises(ValueError, SymbolFile, filename)
+        finally:
+            os.remove(filename)
+
+if __name__=="__main__":
+    unittest.main()
@@ -20,38 +20,25 @@
 # follows all of the valid data. The sum is supposed to be equal to the 
 # bank number. Filler words of 0 are added after the checksum word, so 
 # that the banks never end prematurely
+#
+# Rope images in .bin format, as written by the assembler, are also accepted.
+# Many files may be checked at once, in parallel, optionally writing a report
+# with the result for each bank in CSV format.
 
 
+import os
 import sys
+import csv
+import multiprocessing
+from itertools import imap
+from array import array
 from optparse import OptionParser
 
-def convertToNative(n):
-    i = n
-    if (n & 040000) != 0:
-        i = -(077777 & ~i)
-    return i
-
-
-def add(n1, n2):
-    # Convert from AGC 1's-complement format to the native integer.
-    i1 = convertToNative(n1)
-    i2 = convertToNative(n2)
-    sum = i1 + i2
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agcasm"))
+from binary import ObjectCode
 
-    if sum > 16383:
-        sum -= 16384
-        sum += 1
-    elif sum < -16383:
-        sum += 16384
-        sum -= 1
-
-    if sum > 16383 or sum < -16383:
-        print "Arithmetic overflow."
-    
-    if sum < 0:
-        sum = (077777 & ~(-sum))
-        
-    return sum
+BANKSIZE = 02000                        # Words per bank.
+BINSIZE = 2 * 044 * BANKSIZE            # Size of a Block II .bin file in bytes.
 
 
 def getBugger(data):
@@ -72,20 +59,15 @@ def getBugger(data):
     return data[index]
     
 
-def main():
-    parser = OptionParser("usage: %prog binsrc_file")
-    (options, args) = parser.parse_args()
-    if len(args) < 1:
-        parser.error("Binsource file must be supplied!")
-        sys.exit(1)
-
-    bsfile = open(args[0], 'r')
+def readBinsource(filename):
+    """Parse a binsource file. Return (banks, bankpages, messages), where banks maps each bank number to its
+    words, bankpages maps it to its page numbers, and messages are any warnings."""
+    bsfile = open(filename, 'r')
     lines = bsfile.readlines()
-    
-    print
-    print "Parsing", args[0]
-    
+    bsfile.close()
+
     banks = {}
+    messages = []
     linenum = 0
     bank = -1
     banklines = 0
@@ -105,10 +87,10 @@ def main():
             if bank != -1:
                 if bankwords != 1024:
                     if bankwords % 256 != 0:
-                        print "Error: bank %02d (%03o) ending on line %d: invalid length, expected 1024, got %d." \
-                              % (bank, bank, linenum-2, bankwords)
+                        messages.append("Error: bank %02d (%03o) ending on line %d: invalid length, expected 1024, got %d." \
+                                        % (bank, bank, linenum-2, bankwords))
             bankpages[bank] = pages[:-1]
-            pages = [ pages[-1] ]
+            pages = pages[-1:]
             banklines = 0
             bankwords = 0
             # Assume bank number is always octal.
@@ -121,37 +103,135 @@ def main():
                 value = value[:value.index(',')]
             try:
                 octval = int(value, 8)
-            except:
-                print "Error: invalid octal number on line", linenum
-                sys.exit(1)
+            except ValueError:
+                raise ValueError("invalid octal number on line %d" % linenum)
             banks[bank].append(octval)
             bankwords += 1
 
     bankpages[bank] = pages
+    return (banks, bankpages, messages)
+
+
+def readBin(filename):
+    """Read a Block II rope image in .bin format. Return (banks, bankpages, messages) as readBinsource() does,
+    without page numbers."""
+    data = open(filename, 'rb').read()
+    if len(data) != BINSIZE:
+        raise ValueError("invalid length, expected %d bytes, got %d" % (BINSIZE, len(data)))
+    words = array('H', data)
+    if sys.byteorder == "little":
+        words.byteswap()
+    banks = {}
+    for index in range(len(words) / BANKSIZE):
+        # Banks 2 and 3 come first, as they are fixed-fixed.
+        bank = index
+        if bank < 4:
+            bank ^= 2
+        banks[bank] = [ word >> 1 for word in words[index * BANKSIZE:(index + 1) * BANKSIZE] ]
+    return (banks, {}, [])
+
+
+def checkFile(filename):
+    """Check the bank checksums of a .bin or binsource file. Return (filename, results, messages, error), where
+    results is a list of (bank, pages, bugger, checksum, ok) for each bank, and error describes why the file could
+    not be checked, or is None."""
+    try:
+        if filename.endswith(".bin"):
+            (banks, bankpages, messages) = readBin(filename)
+        else:
+            (banks, bankpages, messages) = readBinsource(filename)
+    except (IOError, ValueError), e:
+        return (filename, [], [], str(e))
+
+    if len(banks) not in (24, 36):
+        return (filename, [], messages, "invalid rope image")
 
-    if len(banks) == 36:
+    results = []
+    for bank in sorted(banks):
+        total = ObjectCode.sum(banks[bank])
+        ok = (total == bank or total == (077777 & ~bank))
+        results.append((bank, bankpages.get(bank, []), getBugger(banks[bank]), total, ok))
+    return (filename, results, messages, None)
+
+
+def printResults(filename, results, messages, error):
+    print
+    print "Parsing", filename
+    for message in messages:
+        print message
+    if error:
+        print "Error: %s" % error
+        return
+
+    if len(results) == 36:
         print "AGC Block II rope image detected"
-    elif len(banks) == 24:
-        print "AGC Block I rope image detected"
     else:
-        print "Invalid rope image!"
-        sys.exit(1)
+        print "AGC Block I rope image detected"
     print
     
-    for bank in banks:
-        checksum = 0
-        for word in banks[bank]:
-            checksum = add(word, checksum)
-        bugger = getBugger(banks[bank])
-        if checksum == bank or checksum == (077777 & ~bank):
-            print "Bank %02d (%03o): pages %d-%d, bugger %05o, checksum %05o (%05o,%05o) OK" \
-                  % (bank, bank, bankpages[bank][0], bankpages[bank][-1], bugger, checksum, bank, 077777 & ~bank)
+    for (bank, pages, bugger, total, ok) in results:
+        if pages:
+            pagestr = "pages %d-%d, " % (pages[0], pages[-1])
         else:
-            print "Bank %02d (%03o): pages %d-%d, bugger %05o, checksum %05o (%05o,%05o) ERROR" \
-                  % (bank, bank, bankpages[bank][0], bankpages[bank][-1], bugger, checksum, bank, 077777 & ~bank)
-            
-    bsfile.close()
+            pagestr = ""
+        if ok:
+            status = "OK"
+        else:
+            status = "ERROR"
+        print "Bank %02d (%03o): %sbugger %05o, checksum %05o (%05o,%05o) %s" \
+              % (bank, bank, pagestr, bugger, total, bank, 077777 & ~bank, status)
+
+
+def main():
+    parser = OptionParser("usage: %prog [options] rope_file...")
+    parser.add_option("-j", "--jobs",   type="int", dest="jobs",       default=multiprocessing.cpu_count(), help="Number of files to check in parallel, default is the number of CPUs.")
+    parser.add_option("-r", "--report",             dest="reportfile", metavar="FILE",                      help="Write a report of each bank checked to FILE in CSV format, - for stdout.")
+    parser.add_option("-q", "--quiet",  action="store_true", dest="quiet", default=False,                   help="Do not print the result of each bank.")
+    (options, args) = parser.parse_args()
+    if len(args) < 1:
+        parser.error("Binsource or .bin file must be supplied!")
+        sys.exit(1)
+
+    report = None
+    if options.reportfile:
+        if options.reportfile == '-':
+            reportfile = sys.stdout
+        else:
+            reportfile = open(options.reportfile, 'wb')
+        report = csv.writer(reportfile)
+        report.writerow(("file", "bank", "bugger", "checksum", "status"))
+
+    pool = None
+    if options.jobs > 1 and len(args) > 1:
+        pool = multiprocessing.Pool(min(options.jobs, len(args)))
+        results = pool.imap(checkFile, args)
+    else:
+        results = imap(checkFile, args)
+
+    failures = 0
+    for (filename, banks, messages, error) in results:
+        if not options.quiet:
+            printResults(filename, banks, messages, error)
+        if error:
+            failures += 1
+        for (bank, pages, bugger, total, ok) in banks:
+            if not ok:
+                failures += 1
+        if report:
+            if error:
+                report.writerow((filename, "", "", "", "INVALID"))
+            for (bank, pages, bugger, total, ok) in banks:
+                report.writerow((filename, "%02o" % bank, "%05o" % bugger, "%05o" % total, ok and "PASS" or "FAIL"))
+
+    if pool:
+        pool.close()
+        pool.join()
+    if report and options.reportfile != '-':
+        reportfile.close()
+
+    if failures:
+        return 1
     
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
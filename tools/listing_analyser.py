@@ -25,8 +25,11 @@
 # resulting core (ROM) address. This allows differences between core files
 # to be more easily traced to the relevant sections of the AGC sources.
 
+import os
 import sys
 import glob
+import bisect
+import cPickle as pickle
 
 class CoreBlock:
     """Class defining information about a code block in a core file."""
@@ -102,11 +105,148 @@ def analyse(listing):
 
 
 def findBlock(blocks, address):
-    """Find the block containing the supplied core address."""
-    for i in range(len(blocks)-1):
-        if blocks[i].coreaddr <= address < blocks[i+1].coreaddr:
-            return blocks[i]
-    return blocks[len(blocks)-1]
+    """Find the block containing the supplied core address, in a list of blocks sorted by core address."""
+    i = bisect.bisect_right(blocks, CoreBlock(address, None, 0, 0, 0, None)) - 1
+    if i < 0:
+        return blocks[len(blocks)-1]
+    return blocks[i]
+
+
+class ListingIndex:
+    """Index of a yaYUL listing file, for looking up core differences.
+
+    Holds the code blocks with a sorted list of their core addresses, a map from listing address to source line,
+    and the bugger words, so that each lookup is a binary search or a dictionary access. Source lines are stored
+    as file offsets and read from the listing when looked up.
+
+    The index is saved next to the listing, and reused as long as the size and modification time of the listing
+    are unchanged."""
+
+    VERSION = 2
+
+    def __init__(self, listing, cache=True):
+        self.listing = listing
+        self.filename = listing + ".idx"
+        self.file = None
+        self.blocks = []
+        self.lines = {}         # Listing address -> (module, pagenum, linenum, file offset).
+        self.buggers = {}       # Bugger word address -> bugger word value.
+        self.loaded = False     # Index was loaded from the index file.
+        stat = os.stat(listing)
+        self.key = (stat.st_size, stat.st_mtime)
+        if cache:
+            self.load()
+        if not self.loaded:
+            self.blocks = analyse(listing)
+            self._indexLines()
+            if cache:
+                self.save()
+        self.coreaddrs = [ block.coreaddr for block in self.blocks ]
+
+    def load(self):
+        "Load the index file, if it exists and matches the listing."
+        if not os.path.isfile(self.filename):
+            return
+        try:
+            f = open(self.filename, 'rb')
+            try:
+                (version, key, blocks, lines, buggers) = pickle.load(f)
+            finally:
+                f.close()
+        except Exception:
+            print >>sys.stderr, "Warning: unable to read %s, ignoring" % (self.filename)
+            return
+        if version == self.VERSION and key == self.key:
+            self.blocks = blocks
+            self.lines = lines
+            self.buggers = buggers
+            self.loaded = True
+
+    def save(self):
+        "Write the index file, if possible."
+        try:
+            f = open(self.filename, 'wb')
+            try:
+                pickle.dump((self.VERSION, self.key, self.blocks, self.lines, self.buggers), f, pickle.HIGHEST_PROTOCOL)
+            finally:
+                f.close()
+        except IOError:
+            print >>sys.stderr, "Warning: unable to write %s" % (self.filename)
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def _indexLines(self):
+        module = None
+        pagenum = 0
+        linenum = 0
+        offset = 0
+        for line in open(self.listing, 'rb'):
+            linenum += 1
+            start = offset
+            offset += len(line)
+            elems = line.split()
+            if len(elems) > 0:
+                if not line.startswith(' '):
+                    if "# Page " in line and "scans" not in line:
+                        pagenum = line.split()[3]
+                        if pagenum.isdigit():
+                            pagenum = int(pagenum)
+                    if elems[0][0].isdigit():
+                        if len(elems) > 1:
+                            if elems[1].startswith('$'):
+                                module = elems[1][1:].split('.')[0]
+                            else:
+                                if len(elems) > 2:
+                                    if elems[1][0].isdigit() and elems[2][0].isdigit() and len(elems[2]) == 5:
+                                        address = elems[1]
+                                        self.lines[address] = (module, pagenum, linenum, start)
+                                        if len(elems) > 3:
+                                            # Handle 2-word quantities, yaYUL outputs listing for the two combined at the address of the first.
+                                            if elems[3][0].isdigit() and len(elems[3]) == 5:
+                                                if "," in address:
+                                                    bank = int(address.split(',')[0], 8)
+                                                    woffset = int(address.split(',')[1], 8)
+                                                    woffset += 1
+                                                    address = "%02o,%04o" % (bank, woffset)
+                                                else:
+                                                    woffset = int(address, 8)
+                                                    woffset += 1
+                                                    address = "%04o" % woffset
+                                                self.lines[address] = (module, pagenum, linenum, start)
+                    if line.startswith("Bugger") and len(elems) > 4:
+                        bval = elems[2]
+                        baddr = elems[4]
+                        if baddr.endswith('.'):
+                            baddr = baddr[:-1]
+                        if baddr not in self.buggers:
+                            self.buggers[baddr] = bval
+
+    def findBlock(self, coreaddr):
+        "Find the block containing the supplied core address."
+        i = bisect.bisect_right(self.coreaddrs, coreaddr) - 1
+        return self.blocks[i]
+
+    def findLine(self, address):
+        "Return (module, pagenum, linenum, line) for the supplied listing address, or None."
+        location = self.lines.get(address)
+        if location == None:
+            return None
+        (module, pagenum, linenum, offset) = location
+        return (module, pagenum, linenum, self.getLine(offset))
+
+    def getLine(self, offset):
+        "Return the listing line at the supplied file offset."
+        if self.file == None:
+            self.file = open(self.listing, 'rb')
+        self.file.seek(offset)
+        return self.file.readline()
+
+    def findBugger(self, address):
+        "Return the bugger word at the supplied listing address, or None."
+        return self.buggers.get(address)
 
 
 def printBlocks(blocks):
@@ -26,6 +26,10 @@ import glob
 from optparse import OptionParser
 import struct
 import operator
+import mmap
+import itertools
+import functools
+from array import array
 import listing_analyser
 
 
@@ -41,6 +45,7 @@ class CoreDiff:
         self.module = None
         self.srcline = None
         self.linenum = None
+        self.symbol = None          # Nearest symbol and offset, if a symbol table was supplied.
 
     def setloc(self, pagenum, module, linenum, srcline):
         self.pagenum = pagenum      # Listing page number.
@@ -62,11 +67,232 @@ class CoreDiff:
         if self.srcline:
             srcline = self.srcline.rstrip()
         line += "%s" % (srcline)
+        if self.symbol:
+            line += "   [%s]" % (self.symbol)
         return line
 
     def __cmp__(self, other):
         return (self.coreaddr - other.coreaddr)
 
+BLOCKSIZE = 256         # Number of bytes of the core images compared at a time.
+
+def mapCore(filename):
+    "Return a read-only memory map of a core file."
+    f = open(filename, "rb")
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        f.close()
+
+def isSuperDiff(leftval, rightval):
+    "Return True if the two words differ only by 100 vs. 011 in bits 5,6,7."
+    return ((leftval ^ rightval) & 0160) == 0160 and ((leftval & 0160) == 0100 or (leftval & 0160) == 0060)
+
+def isWantedDiff(leftval, rightval, noZero=False, noSuper=False, onlySuper=False):
+    "Return True if a difference between two words passes the filters."
+    if noZero and rightval == 0:
+        return False
+    if noSuper or onlySuper:
+        isSuper = isSuperDiff(leftval, rightval)
+        if noSuper and isSuper:
+            return False
+        if onlySuper and not isSuper:
+            return False
+    return True
+
+def compareCores(left, right, noZero=False, noSuper=False, onlySuper=False):
+    """Compare two core images of the same length, supplied as strings or memory maps. Return the differing
+    words as three lists: the word indices, the left values and the right values, with the parity bit removed.
+
+    Equal blocks are skipped with a single comparison, and the differing words of the other blocks are found in
+    bulk. The filters are then applied as a mask over the differing words."""
+    indices = []
+    leftvals = []
+    rightvals = []
+    if left[:] == right[:]:
+        return (indices, leftvals, rightvals)
+    swap = (sys.byteorder == "little")
+    for offset in range(0, len(left), BLOCKSIZE):
+        leftblock = left[offset:offset + BLOCKSIZE]
+        rightblock = right[offset:offset + BLOCKSIZE]
+        if leftblock == rightblock:
+            continue
+        leftwords = array('H', leftblock)
+        rightwords = array('H', rightblock)
+        if swap:
+            leftwords.byteswap()
+            rightwords.byteswap()
+        base = offset / 2
+        for i in itertools.compress(itertools.count(), itertools.imap(operator.ne, leftwords, rightwords)):
+            indices.append(base + i)
+            leftvals.append(leftwords[i] >> 1)
+            rightvals.append(rightwords[i] >> 1)
+
+    if noZero or noSuper or onlySuper:
+        wanted = functools.partial(isWantedDiff, noZero=noZero, noSuper=noSuper, onlySuper=onlySuper)
+        keep = map(wanted, leftvals, rightvals)
+        indices = list(itertools.compress(indices, keep))
+        leftvals = list(itertools.compress(leftvals, keep))
+        rightvals = list(itertools.compress(rightvals, keep))
+    return (indices, leftvals, rightvals)
+
+def compareAllCores(cores, noZero=False, noSuper=False, onlySuper=False):
+    """Compare N core images of the same length with each other. The images are loaded into a single word array.
+    Return a list of (index, values, pairs) for each word on which any of the cores differ, where values are the
+    words of each core with the parity bit removed, and pairs are the (left, right) core numbers which differ,
+    after applying the filters."""
+    numcores = len(cores)
+    numwords = len(cores[0]) / 2
+    words = array('H')
+    for core in cores:
+        words.fromstring(core[:])
+    if sys.byteorder == "little":
+        words.byteswap()
+    allpairs = [ (left, right) for left in range(numcores) for right in range(left + 1, numcores) ]
+    blockwords = BLOCKSIZE / 2
+    results = []
+    for start in range(0, numwords, blockwords):
+        blocks = [ words[n * numwords + start:n * numwords + start + blockwords] for n in range(numcores) ]
+        if blocks.count(blocks[0]) == numcores:
+            continue
+        for i in range(blockwords):
+            raw = [ block[i] for block in blocks ]
+            if raw.count(raw[0]) == numcores:
+                continue
+            values = [ word >> 1 for word in raw ]
+            pairs = []
+            for (left, right) in allpairs:
+                if raw[left] != raw[right] and isWantedDiff(values[left], values[right], noZero, noSuper, onlySuper):
+                    pairs.append((left, right))
+            if pairs:
+                results.append((start + i, values, pairs))
+    return results
+
+def compareMatrix(cores, listindex=None, symfile=None):
+    """Compare all of the supplied core files with each other, and print the pairwise difference counts in total,
+    per bank and per module, followed by the words on which they disagree."""
+    numcores = len(cores)
+    allpairs = [ (left, right) for left in range(numcores) for right in range(left + 1, numcores) ]
+
+    log("Comparing core image files... ", verbose=True)
+    maps = [ mapCore(core) for core in cores ]
+    try:
+        results = compareAllCores(maps, options.noZero, options.noSuper, options.onlySuper)
+    finally:
+        for m in maps:
+            m.close()
+    log("%d words differ" % (len(results)), verbose=True)
+
+    totals = {}
+    bankcounts = {}
+    modulecounts = {}
+    for pair in allpairs:
+        totals[pair] = 0
+    for (i, values, pairs) in results:
+        bank = i / 02000
+        if bank < 4:
+            bank ^= 2
+        if bank not in bankcounts:
+            bankcounts[bank] = dict([ (pair, 0) for pair in allpairs ])
+        module = None
+        if listindex:
+            block = listindex.findBlock(i)
+            if block:
+                module = block.module
+                if module not in modulecounts:
+                    modulecounts[module] = dict([ (pair, 0) for pair in allpairs ])
+        for pair in pairs:
+            totals[pair] += 1
+            bankcounts[bank][pair] += 1
+            if module:
+                modulecounts[module][pair] += 1
+
+    pairheader = "".join([ "%8s" % ("%d-%d" % pair) for pair in allpairs ])
+
+    log("")
+    log("Difference matrix:")
+    log("")
+    log("     " + "".join([ "%8d" % n for n in range(numcores) ]))
+    for left in range(numcores):
+        line = "%4d " % left
+        for right in range(numcores):
+            if left == right:
+                line += "%8s" % "-"
+            else:
+                line += "%8d" % totals[(min(left, right), max(left, right))]
+        log(line)
+
+    if bankcounts:
+        log("")
+        log("Per-bank differences:")
+        log("-" * 80)
+        log("Bank" + pairheader)
+        for bank in sorted(bankcounts):
+            log("  %02o" % bank + "".join([ "%8d" % bankcounts[bank][pair] for pair in allpairs ]))
+        log("-" * 80)
+
+    if modulecounts:
+        log("")
+        log("Per-module differences:")
+        log("-" * 80)
+        log("%-48s" % "Module" + pairheader)
+        for module in sorted(modulecounts):
+            log("%-48s" % module + "".join([ "%8d" % modulecounts[module][pair] for pair in allpairs ]))
+        log("-" * 80)
+
+    if results:
+        log("")
+        log("Core address     " + "".join([ "%6d" % n for n in range(numcores) ]) + "   Disagree         Module")
+        log("---------------- " + "".join([ " -----" for n in range(numcores) ]) + "   ---------------- ------------------------------------------------")
+        for (i, values, pairs) in results:
+            # The ropes which disagree are those which differ from the most common value.
+            majority = max(values, key=values.count)
+            disagree = ",".join([ "%d" % n for n in range(numcores) if values[n] != majority ])
+            if not disagree:
+                disagree = ",".join([ "%d" % n for n in sorted(set([ n for pair in pairs for n in pair ])) ])
+            line = "%06o (%7s) " % (i, coreToAddress(i)) + "".join([ " %05o" % value for value in values ])
+            line += "   %-16s" % disagree
+            if listindex:
+                block = listindex.findBlock(i)
+                if block:
+                    line += " %s" % block.module
+            if symfile:
+                label = symbolLabel(symfile, i)
+                if label:
+                    line += "   [%s]" % (label)
+            log(line.rstrip())
+
+    return len(results)
+
+def coreToAddress(coreaddr):
+    "Convert a core file word offset to a listing address string."
+    if coreaddr < 04000:
+        return "   %04o" % (coreaddr + 04000)
+    bank = coreaddr / 02000
+    if bank < 4:
+        bank ^= 2
+    return "%02o,%04o" % (bank, 02000 + (coreaddr % 02000))
+
+def coreToPseudo(coreaddr):
+    "Convert a core file word offset to an assembler pseudo address."
+    if coreaddr < 04000:
+        return coreaddr + 04000
+    bank = coreaddr / 02000
+    if bank < 4:
+        bank ^= 2
+    return 010000 + bank * 02000 + (coreaddr % 02000)
+
+def symbolLabel(symfile, coreaddr):
+    "Return the nearest symbol and offset for a core file word offset, as NAME+off, or None if none in the same bank."
+    pa = coreToPseudo(coreaddr)
+    result = symfile.findAddress(pa)
+    if result:
+        (entry, offset) = result
+        # Only use symbols in the same bank.
+        if entry.value / 02000 == pa / 02000:
+            return "%s+%o" % (entry.name, offset)
+    return None
+
 def log(text, verbose=False, newline=True):
     if verbose == False or (verbose == True and options.verbose == True):
         if options.outfile:
@@ -84,7 +310,7 @@ def main():
 
     global options
 
-    parser = OptionParser("usage: %prog [options] core1 core2")
+    parser = OptionParser("usage: %prog [options] core1 core2 [core...]")
     parser.add_option("-p", "--by-page",      action="store_true",  dest="bypage",      default=False,                 help="Sort differences by page number.")
     parser.add_option("-c", "--no-checksums", action="store_false", dest="checksums",   default=True,                  help="Discard differences in checksums.")
     parser.add_option("-N", "--no-super",     action="store_true",  dest="noSuper",     default=False,                 help="Discard differences in which one word has 100 in bits 5,6,7 and the other has 011.")
@@ -94,6 +320,9 @@ def main():
     parser.add_option("-v", "--verbose",      action="store_true",  dest="verbose",     default=False,                 help="Print extra information.")
     parser.add_option("-o", "--output",                             dest="outfilename",                metavar="FILE", help="Write output to file.")
     parser.add_option("-a", "--annotate",     action="store_true",  dest="annotate",    default=False,                 help="Output a modified listing annotated with core differences.")
+    parser.add_option("-m", "--matrix",       action="store_true",  dest="matrix",      default=False,                 help="Compare all the core files with each other, implied by more than two core files.")
+    parser.add_option("-I", "--no-index-cache", action="store_false", dest="indexCache", default=True,                 help="Do not read or write the listing index file, <listing>.idx.")
+    parser.add_option("-y", "--symtab",                             dest="symtab",                     metavar="FILE", help="Label differences with the nearest symbol from a binary symbol table.")
 
     (options, args) = parser.parse_args()
 
@@ -120,9 +349,10 @@ def main():
     for core in cores:
         sizes.append(os.path.getsize(core))
 
-    if sizes[0] != sizes[1]:
-        parser.error("Core files are not the same size!")
-        sys.exit(1)
+    for size in sizes[1:]:
+        if size != sizes[0]:
+            parser.error("Core files are not the same size!")
+            sys.exit(1)
 
     if sizes[0] != CORELEN:
         parser.error("Core files are incorrect length, must be %d bytes!" % CORELEN)
@@ -130,18 +360,20 @@ def main():
 
     log("yaAGC Core Rope Differencer")
     log("")
-    log("Left core file:  %s" % cores[0])
-    log("Right core file: %s" % cores[1])
+    if len(cores) > 2:
+        options.matrix = True
+    if options.matrix:
+        for (n, core) in enumerate(cores):
+            log("Core file %d: %s" % (n, core))
+    else:
+        log("Left core file:  %s" % cores[0])
+        log("Right core file: %s" % cores[1])
 
-    leftcore = open(cores[0], "rb")
-    rightcore = open(cores[1], "rb")
 
     leftdir = os.path.abspath(os.path.dirname(cores[0]))
-    leftlst = os.path.join(leftdir, "*.lst")
-    rightdir = os.path.abspath(os.path.dirname(cores[1]))
-    rightlst = os.path.join(rightdir, "*.lst")
-    lfiles = glob.glob(leftlst)
-    lfiles.extend(glob.glob(rightlst))
+    lfiles = []
+    for core in cores:
+        lfiles.extend(glob.glob(os.path.join(os.path.abspath(os.path.dirname(core)), "*.lst")))
     # Remove duplicates.
     ldict = {}
     for x in lfiles:
@@ -152,7 +384,21 @@ def main():
         print >>sys.stderr, "Warning: no listing file for analysis!"
         options.analyse = False
 
+    symfile = None
+    if options.symtab:
+        if not os.path.isfile(options.symtab):
+            parser.error("File \"%s\" does not exist" % options.symtab)
+            sys.exit(1)
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agcasm"))
+        from symbol_file import SymbolFile
+        try:
+            symfile = SymbolFile(options.symtab)
+        except ValueError, e:
+            parser.error(str(e))
+
+    # Nothing after the listing index is built may exit without closing it.
     listfile = None
+    listindex = None
     if options.analyse:
         if len(lfiles) > 1:
             for l in lfiles:
@@ -169,7 +415,23 @@ def main():
         log("Build: %s" % os.path.basename(os.path.dirname(listfile).split('.')[0]))
 
         log("Analysing listing file... ", verbose=True)
-        blocks = listing_analyser.analyse(listfile)
+        listindex = listing_analyser.ListingIndex(listfile, cache=options.indexCache)
+
+    if options.matrix:
+        difftotal = compareMatrix(cores, listindex, symfile)
+        log("Done", verbose=True)
+        if listindex:
+            listindex.close()
+        if options.outfilename:
+            options.outfile.close()
+        if difftotal > 0:
+            if options.outfilename:
+                print "Core differences are in", options.outfilename
+            else:
+                print "Core differences found"
+        else:
+            print "No core differences found"
+        return
 
     options.annofile = None
     if options.annotate:
@@ -206,115 +468,46 @@ def main():
     lines = []
 
     log("Comparing core image files... ", verbose=True)
+    leftcore = mapCore(cores[0])
+    rightcore = mapCore(cores[1])
     try:
-        while True:
-            leftdata = leftcore.read(2)
-            rightdata = rightcore.read(2)
-            if not leftdata or not rightdata:
-                break
-            # Read 16-bit word and unpack into 2 byte tuple, native endianness.
-            leftword = struct.unpack("BB", leftdata)
-            rightword = struct.unpack("BB", rightdata)
-            if leftword[0] != rightword[0] or leftword[1] != rightword[1]:
-                # Words differ. Check super bits.
-                leftval = (leftword[0] << 7) | (leftword[1] >> 1)
-                rightval = (rightword[0] << 7) | (rightword[1] >> 1)
-                if options.noZero and rightval == 0:
-                    continue
-                if ((leftval ^ rightval) & 0160) == 0160 and ((leftval & 0160) == 0100 or (leftval & 0160) == 0060):
-                    if options.noSuper:
-                        continue
-                else:
-                    if options.onlySuper:
-                        continue
-                i = (leftcore.tell() - 2) / 2
-                offset = 02000 + (i % 02000)
-                bank = i / 02000
-                if bank < 4:
-                    bank ^= 2
-                line = "%06o (" % i
-                if i < 04000:
-                    address = "   %04o" % (i + 04000)
-                else:
-                    address = "%02o,%04o" % (bank, offset)
-                line += "%s)   " % address
-                line += "%05o   %05o" % (leftval, rightval)
-                if options.analyse:
-                    block = listing_analyser.findBlock(blocks, i)
-                    if block:
-                        line += "   " + block.getInfo()
-                        diffcount[block.module] += 1
-                diffs.append(CoreDiff(i, address, leftval, rightval))
-                difftotal += 1
-                lines.append(line)
+        (indices, leftvals, rightvals) = compareCores(leftcore, rightcore, options.noZero, options.noSuper, options.onlySuper)
     finally:
         leftcore.close()
         rightcore.close()
 
+    for (i, leftval, rightval) in zip(indices, leftvals, rightvals):
+        address = coreToAddress(i)
+        line = "%06o (%s)   %05o   %05o" % (i, address, leftval, rightval)
+        if options.analyse:
+            block = listindex.findBlock(i)
+            if block:
+                line += "   " + block.getInfo()
+                diffcount[block.module] += 1
+        diff = CoreDiff(i, address, leftval, rightval)
+        if symfile:
+            diff.symbol = symbolLabel(symfile, i)
+        diffs.append(diff)
+        difftotal += 1
+        lines.append(line)
+
     log("%d core image differences" % (difftotal), verbose=True)
 
-    lines = {}
-    buggers = []
-    module = None
-    pagenum = 0
-    address = 0
     checkdiffs = 0
-    linenum = 0
-
-    log("Building module/page/line list... ", verbose=True)
-    for line in open(listfile, "r"):
-        linenum += 1
-        elems = line.split()
-        if len(elems) > 0:
-            if not line.startswith(' '):
-                if "# Page " in line and "scans" not in line:
-                    pagenum = line.split()[3]
-                    if pagenum.isdigit():
-                        pagenum = int(pagenum)
-                if elems[0][0].isdigit():
-                    if len(elems) > 1:
-                        if elems[1].startswith('$'):
-                            module = elems[1][1:].split('.')[0]
-                        else:
-                            if len(elems) > 2:
-                                if elems[1][0].isdigit() and elems[2][0].isdigit() and len(elems[2]) == 5:
-                                    address = elems[1]
-                                    lines[address] = (module, pagenum, linenum, line)
-                                    if len(elems) > 3:
-                                        # Handle 2-word quantities, yaYUL outputs listing for the two combined at the address of the first.
-                                        if elems[3][0].isdigit() and len(elems[3]) == 5:
-                                            if "," in address:
-                                                bank = int(address.split(',')[0], 8)
-                                                offset = int(address.split(',')[1], 8)
-                                                offset += 1
-                                                address = "%02o,%04o" % (bank, offset)
-                                            else:
-                                                offset = int(address, 8)
-                                                offset += 1
-                                                address = "%04o" % offset
-                                            lines[address] = (module, pagenum, linenum, line)
-                if line.startswith("Bugger"):
-                    buggers.append(line)
 
     log("Setting diff locations... ", verbose=True)
     for diff in diffs:
         address = diff.address.strip()
-        if address in lines.keys():
-            (module, pagenum, linenum, line) = lines[address]
+        location = listindex.findLine(address)
+        if location:
+            (module, pagenum, linenum, line) = location
             diff.setloc(pagenum, module, linenum, line)
         elif diff.srcline == None:
-            foundBugger = False
-            for bugger in buggers:
-                bval = bugger.split()[2]
-                baddr = bugger.split()[4]
-                if baddr.endswith('.'):
-                    baddr = baddr[:-1]
-                if address == baddr:
-                    diff.setloc(0, "Checksum", 0, "%s%s%s%s" % (15 * ' ', baddr, 11 * ' ', bval))
-                    checkdiffs += 1
-                    foundBugger = True
-                    break
-            if not foundBugger:
+            bval = listindex.findBugger(address)
+            if bval:
+                diff.setloc(0, "Checksum", 0, "%s%s%s%s" % (15 * ' ', address, 11 * ' ', bval))
+                checkdiffs += 1
+            else:
                 print >>sys.stderr, "Error: address %s not found in listing file" % (address)
                 log("Error: address %s not found in listing file" % (address))
         else:
@@ -421,7 +614,7 @@ def main():
                     else:
                         line += "%02o,%04o)   " % (bank, offset)
                     line += "%6d" % length
-                    block = listing_analyser.findBlock(blocks, i)
+                    block = listindex.findBlock(i)
                     if block:
                         line += "   " + block.getInfo()
                     log(line)
@@ -456,6 +649,9 @@ def main():
 
     log("Done", verbose=True)
 
+    if listindex:
+        listindex.close()
+
     if options.annofile:
         options.annofile.close()
 